@@ -1,41 +1,64 @@
 import os
-from flask import Flask, jsonify, send_file
+import time
+from flask import Flask, Response, g, jsonify, request
+from werkzeug.security import safe_join
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from routes.download import download_song_bp
-from routes.download_album import download_album_bp
-from routes.search import search_bp
+from routes.download_album import album_cost, download_album_bp
+from routes.download_playlist import download_playlist_bp, playlist_cost
+from routes.search import search_bp, sugerir_busqueda
 from routes.album import album_bp
 from routes.artist import artist_bp
 from routes.charts import chart_bp
 from routes.artist_discography import artist_discography_bp
-from routes.song_preview import song_preview_bp
+from routes.song_preview import obtener_audio_preview, song_preview_bp
 from routes.playlist import playlist_bp 
 from routes.playlist_tracks import playlist_tracks_bp
+from routes.jobs import jobs_bp
+from routes.track import track_bp
+from services import deezer_session, jobs, metrics, prewarm, storage
+from services.config import DOWNLOAD_DIR
+from services.file_serving import serve_file
+from services.rate_limit import RATELIMIT_STORAGE_URI
 
 app = Flask(__name__)
 CORS(app)
 
-# Configuración del Rate Limiter
+# Configuración del Rate Limiter: contadores compartidos entre workers y
+# cabeceras X-RateLimit-* y Retry-After para que los clientes esperen
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,  # Limita por dirección IP
-    default_limits=["200 per hour", "50 per minute"]  # Límites globales
+    default_limits=["200 per hour", "50 per minute"],  # Límites globales
+    storage_uri=RATELIMIT_STORAGE_URI,
+    headers_enabled=True,
+    swallow_errors=True  # Si el almacenamiento falla, no se limita
 )
 
 # Límites específicos para rutas que consumen más recursos
 limiter.limit("120 per hour")(download_song_bp)
-limiter.limit("50 per hour")(download_album_bp)
+# Los álbumes se cobran por pista (~50 álbumes de 12 pistas por hora)
+limiter.limit(os.environ.get("ALBUM_RATE_LIMIT", "600 per hour"), cost=album_cost)(download_album_bp)
+limiter.limit(os.environ.get("PLAYLIST_RATE_LIMIT", "600 per hour"), cost=playlist_cost)(download_playlist_bp)
 limiter.limit("120 per hour")(playlist_tracks_bp)
 
+# El autocompletado se pide por pulsación y casi siempre sale del índice local
+limiter.limit("600 per minute")(sugerir_busqueda)
+# Una página de chart empieza decenas de previews a la vez
+limiter.limit("600 per minute")(obtener_audio_preview)
+
+# El sondeo del estado de los trabajos no consume cuota
+limiter.exempt(jobs_bp)
+
 # Directorio de descargas
-DOWNLOAD_DIR = './downloads'
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
 # Registro de blueprints con sus prefijos
 app.register_blueprint(download_song_bp, url_prefix='/download-song')
 app.register_blueprint(download_album_bp, url_prefix='/download-album')
+app.register_blueprint(download_playlist_bp, url_prefix='/download-playlist')
 app.register_blueprint(search_bp, url_prefix="/search")
 app.register_blueprint(album_bp, url_prefix="/album")
 app.register_blueprint(artist_bp, url_prefix="/artist")
@@ -44,15 +67,69 @@ app.register_blueprint(artist_discography_bp, url_prefix='/artist-discography')
 app.register_blueprint(song_preview_bp, url_prefix='/song-preview')
 app.register_blueprint(playlist_bp, url_prefix='/playlist')  
 app.register_blueprint(playlist_tracks_bp, url_prefix='/playlist-tracks')
+app.register_blueprint(jobs_bp, url_prefix='/jobs')
+app.register_blueprint(track_bp, url_prefix='/track')
+
+# Recuperar trabajos pendientes tras un reinicio
+jobs.start()
+
+# Presupuesto de disco y limpieza de descargas antiguas o a medias
+storage.start_sweeper()
+
+# Las sesiones de Deezer se crean al descargar (o ya, si se pide precalentar)
+deezer_session.prewarm()
+
+# Volcado periódico de las métricas de este worker
+metrics.start()
+
+# Chart global y lo que enlaza, refrescados antes de que los pida un cliente
+prewarm.start()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # Se etiqueta por regla de la ruta, no por URL, para acotar las series
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method)
+        metrics.REQUESTS.inc(route=route, method=request.method, status=str(response.status_code))
+    return response
 
 @app.route('/downloads/<path:filename>')
 @limiter.limit("50 per hour")  # Límite específico para descargas
 def download_file(filename):
-    file_path = os.path.join(DOWNLOAD_DIR, filename)
-    if not os.path.isfile(file_path):
+    # safe_join evita salir del directorio de descargas con "../"
+    file_path = safe_join(DOWNLOAD_DIR, filename)
+    if file_path is None or not os.path.isfile(file_path):
         return jsonify({"error": "Archivo no encontrado"}), 404
     
-    return send_file(file_path, as_attachment=True)
+    # Cuenta como acceso para la expulsión LRU
+    storage.touch(file_path)
+
+    # Range/206, ETag fuerte y sendfile (o delegación al proxy)
+    return serve_file(file_path, filename)
+
+@app.route('/storage-stats')
+def storage_stats():
+    # Uso de disco y expulsiones según el último barrido
+    return jsonify(storage.get_stats()), 200
+
+@app.errorhandler(429)
+def rate_limit_exceeded(e):
+    return jsonify({
+        "error": "Demasiadas peticiones",
+        "limit": e.description
+    }), 429
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    # Formato de texto de Prometheus, sumando todos los workers
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.route('/check')
 def check():
@@ -0,0 +1,41 @@
+# bench/fake_deezspot.py
+# DeeLogin falso: download_trackdee escribe un MP3 sintético del tamaño y
+# con el retardo configurados, con la misma estructura de carpetas que
+# deezspot, sin conectarse a Deezer.
+import os
+import time
+
+# Cabecera de trama MPEG-1 Layer III, 128 kbps, 44.1 kHz (417 bytes por trama)
+FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+
+
+class FakeDeeLogin:
+    track_size = 4 * 1024 * 1024
+    delay = 0.5
+
+    def __init__(self, arl=None, **kwargs):
+        self.arl = arl
+
+    def download_trackdee(self, link_track, output_dir, quality_download="MP3_128", **kwargs):
+        song_id = link_track.rstrip("/").split("/")[-1]
+        folder = os.path.join(output_dir, f"Artist - Album {song_id}", "CD 1")
+        os.makedirs(folder, exist_ok=True)
+        time.sleep(self.delay)
+        frames = max(1, self.track_size // len(FRAME))
+        with open(os.path.join(folder, f"{song_id} - Track.mp3"), "wb") as f:
+            chunk = FRAME * 256
+            for _ in range(frames // 256):
+                f.write(chunk)
+            f.write(FRAME * (frames % 256))
+
+
+def install(track_size=None, delay=None):
+    # Las descargas de la app pasan a usar FakeDeeLogin
+    from services import deezer_session
+
+    if track_size is not None:
+        FakeDeeLogin.track_size = track_size
+    if delay is not None:
+        FakeDeeLogin.delay = delay
+    deezer_session.set_session_factory(FakeDeeLogin)
+    return FakeDeeLogin
@@ -0,0 +1,204 @@
+# bench/run.py
+# Banco de pruebas sin red: levanta el sustituto de Deezer/qu.ax, cambia
+# DeeLogin por uno falso, sirve la app en un puerto local y lanza cada ruta
+# con distintos niveles de concurrencia. Informa p50/p95/p99 y rendimiento.
+#
+#   python -m bench.run
+#   python -m bench.run --routes album,download-album --concurrency 1,4,16
+#   python -m bench.run --output results.json
+#   python -m bench.run --compare results.json   # falla si hay regresiones
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench import fake_deezspot
+from bench.stub_server import StubConfig, StubDeezer
+
+# Cada escenario: (ruta de la petición a partir de un id, id base)
+SCENARIOS = {
+    "search": (lambda i: f"/search/?q=bench{i}", 0),
+    "album": (lambda i: f"/album/{i}", 1000),
+    "album-batch": (lambda i: "/album/batch?ids=" + ",".join(str(i + k) for k in range(10)), 1000),
+    "artist": (lambda i: f"/artist/{i}", 1),
+    "artist-top": (lambda i: f"/artist/{i}/top", 1),
+    "discography": (lambda i: f"/artist-discography/{i}/albums", 1),
+    "chart": (lambda i: "/chart/", 0),
+    "playlist-search": (lambda i: f"/playlist/?q=bench{i}", 0),
+    "playlist-tracks": (lambda i: f"/playlist-tracks/{i}", 1),
+    "song-preview": (lambda i: f"/song-preview/{i}", 100001),
+    "track-batch": (lambda i: "/track/batch?ids=" + ",".join(str(i + k) for k in range(20)), 100001),
+    "download-song": (lambda i: f"/download-song/?song_id={i}", 200001),
+    "download-album": (lambda i: f"/download-album/?album_id={i}", 3000),
+}
+DEFAULT_ROUTES = [name for name in SCENARIOS if not name.startswith("download")]
+# Rutas que crean un trabajo: la latencia es la del trabajo completo
+JOB_ROUTES = {"download-album"}
+
+JOB_POLL_INTERVAL = 0.1
+JOB_TIMEOUT = 600
+
+
+def percentile(sorted_values, pct):
+    # Rango más cercano
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _wait_job(session, base_url, response):
+    status_url = base_url + response.headers["Location"]
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        job = session.get(status_url).json()
+        if job.get("status") in ("done", "failed"):
+            return job["status"] == "done"
+        time.sleep(JOB_POLL_INTERVAL)
+    return False
+
+
+def run_scenario(base_url, name, concurrency, total, distinct):
+    build_path, base_id = SCENARIOS[name]
+    local = threading.local()
+
+    def one(n):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        path = build_path(base_id + n % distinct)
+        start = time.perf_counter()
+        try:
+            response = session.get(base_url + path, timeout=JOB_TIMEOUT)
+            ok = response.status_code < 400
+            if ok and name in JOB_ROUTES and response.status_code == 202:
+                ok = _wait_job(session, base_url, response)
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "route": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": total / wall if wall else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Regresión: p95 más alto o rendimiento más bajo que la referencia
+    previous = {(r["route"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        ref = previous.get((result["route"], result["concurrency"]))
+        if ref is None:
+            continue
+        if result["p95_ms"] > ref["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['route']} c={result['concurrency']}: p95 {ref['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result["throughput_rps"] < ref["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{result['route']} c={result['concurrency']}: {ref['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s")
+        if result["errors"] > ref["errors"]:
+            regressions.append(f"{result['route']} c={result['concurrency']}: errores {ref['errors']} -> {result['errors']}")
+    return regressions
+
+
+def start_app(stub, work_dir, track_size, track_delay):
+    # La configuración se lee al importar, así que va antes que la app
+    os.environ["DEEZER_API_URL"] = stub.url
+    os.environ["QUAX_UPLOAD_URL"] = f"{stub.url}/upload.php"
+    os.environ["DATA_DIR"] = os.path.join(work_dir, "data")
+    os.environ["DOWNLOAD_DIR"] = os.path.join(work_dir, "downloads")
+    # La precarga en segundo plano falsearía los escenarios de caché fría
+    os.environ.setdefault("PREWARM_INTERVAL", "0")
+    fake_deezspot.install(track_size=track_size, delay=track_delay)
+
+    from werkzeug.serving import make_server
+    import app as app_module
+
+    app_module.limiter.enabled = False
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark local de musify-dl")
+    parser.add_argument("--routes", default=",".join(DEFAULT_ROUTES),
+                        help=f"Escenarios separados por comas ('all' para todos): {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Niveles de concurrencia")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por ruta y nivel")
+    parser.add_argument("--distinct", type=int, default=50, help="Ids distintos por ruta (controla la tasa de aciertos de caché)")
+    parser.add_argument("--upstream-delay", type=float, default=0.02, help="Latencia simulada de Deezer (s)")
+    parser.add_argument("--album-tracks", type=int, default=12)
+    parser.add_argument("--track-size", type=int, default=4 * 1024 * 1024, help="Tamaño de cada MP3 sintético (bytes)")
+    parser.add_argument("--track-delay", type=float, default=0.5, help="Duración simulada de download_trackdee (s)")
+    parser.add_argument("--output", help="Guardar resultados en JSON")
+    parser.add_argument("--compare", help="JSON de referencia; sale con código 1 si hay regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Margen antes de considerar regresión")
+    args = parser.parse_args(argv)
+
+    routes = list(SCENARIOS) if args.routes == "all" else [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    work_dir = tempfile.mkdtemp(prefix="musify-bench-")
+    stub = StubDeezer(StubConfig(delay=args.upstream_delay, album_tracks=args.album_tracks)).start()
+    server, base_url = start_app(stub, work_dir, args.track_size, args.track_delay)
+
+    results = []
+    print(f"{'ruta':<18}{'conc':>5}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    try:
+        for name in routes:
+            for concurrency in levels:
+                result = run_scenario(base_url, name, concurrency, args.requests, args.distinct)
+                results.append(result)
+                print(f"{name:<18}{concurrency:>5}{result['requests']:>6}{result['errors']:>5}"
+                      f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                      f"{result['throughput_rps']:>9.1f}")
+    finally:
+        server.shutdown()
+        stub.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Peticiones al sustituto de Deezer: {stub.requests} (subidas: {stub.uploads}, {stub.upload_bytes} bytes)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# bench/stub_server.py
+# Sustituto local de la API REST de Deezer (las rutas que usan los
+# blueprints) y del endpoint de subida de qu.ax. Las respuestas son
+# sintéticas y deterministas a partir del id pedido.
+import re
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Bytes de una "portada" o "preview" de prueba
+COVER_BYTES = b"\xff\xd8\xff\xe0" + b"\x00" * 60 * 1024
+PREVIEW_BYTES = b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" * 8 * 1024
+
+
+class StubConfig:
+    def __init__(self, delay=0.0, album_tracks=12, playlist_tracks=300, discography_size=150):
+        self.delay = delay                      # Latencia simulada de cada respuesta
+        self.album_tracks = album_tracks
+        self.playlist_tracks = playlist_tracks
+        self.discography_size = discography_size
+
+
+class StubDeezer:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self.requests = 0
+        self.uploads = 0
+        self.upload_bytes = 0
+        self._lock = threading.Lock()
+        handler = type("Handler", (_Handler,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-deezer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, uploaded=None):
+        with self._lock:
+            self.requests += 1
+            if uploaded is not None:
+                self.uploads += 1
+                self.upload_bytes += uploaded
+
+    # --- Datos sintéticos ---
+
+    def cover_url(self, album_id):
+        return f"{self.url}/cover/{album_id}.jpg"
+
+    def artist(self, artist_id):
+        return {"id": artist_id, "name": f"Artist {artist_id}", "nb_fan": artist_id * 10, "type": "artist"}
+
+    def album_ref(self, album_id):
+        return {
+            "id": album_id, "title": f"Album {album_id}", "type": "album",
+            "cover_xl": self.cover_url(album_id), "cover_big": self.cover_url(album_id),
+            "release_date": f"20{10 + album_id % 15:02d}-01-01",
+        }
+
+    def track(self, track_id, position=1, album_id=None):
+        album_id = album_id or track_id // 100
+        return {
+            "id": track_id, "title": f"Track {track_id}", "duration": 180 + track_id % 120,
+            "track_position": position, "rank": track_id % 1000000, "type": "track",
+            "preview": f"{self.url}/preview/{track_id}.mp3?hdnea=exp={int(time.time()) + 900}~acl=*",
+            "artist": self.artist(album_id % 1000 + 1),
+            "contributors": [self.artist(album_id % 1000 + 1)],
+            "album": self.album_ref(album_id),
+        }
+
+    def album(self, album_id):
+        data = self.album_ref(album_id)
+        tracks = [self.track(album_id * 100 + k, k, album_id) for k in range(1, self.config.album_tracks + 1)]
+        data.update({
+            "artist": self.artist(album_id % 1000 + 1),
+            "nb_tracks": len(tracks),
+            "tracks": {"data": tracks},
+        })
+        return data
+
+    def page(self, items_for, total, query):
+        index = int(query.get("index", ["0"])[0])
+        limit = int(query.get("limit", ["25"])[0])
+        data = [items_for(k) for k in range(index, min(total, index + limit))]
+        return {"data": data, "total": total}
+
+    def route(self, path, query):
+        if m := re.fullmatch(r"/track/(\d+)", path):
+            return self.track(int(m.group(1)))
+        if m := re.fullmatch(r"/album/(\d+)", path):
+            return self.album(int(m.group(1)))
+        if m := re.fullmatch(r"/artist/(\d+)/top", path):
+            artist_id = int(m.group(1))
+            return {"data": [self.track(artist_id * 1000 + k, k) for k in range(1, 11)], "total": 10}
+        if m := re.fullmatch(r"/artist/(\d+)/(albums|singles)", path):
+            artist_id, kind = int(m.group(1)), m.group(2)
+            base = artist_id * 10000 + (0 if kind == "albums" else 5000)
+            record_type = "album" if kind == "albums" else "single"
+            return self.page(lambda k: dict(self.album_ref(base + k), record_type=record_type, fans=k),
+                             self.config.discography_size, query)
+        if m := re.fullmatch(r"/artist/(\d+)", path):
+            return self.artist(int(m.group(1)))
+        if m := re.fullmatch(r"/playlist/(\d+)/tracks", path):
+            playlist_id = int(m.group(1))
+            return self.page(lambda k: self.track(playlist_id * 10000 + k, k + 1), self.config.playlist_tracks, query)
+        if m := re.fullmatch(r"/playlist/(\d+)", path):
+            playlist_id = int(m.group(1))
+            tracks = [self.track(playlist_id * 10000 + k, k + 1) for k in range(min(400, self.config.playlist_tracks))]
+            return {"id": playlist_id, "title": f"Playlist {playlist_id}", "nb_tracks": self.config.playlist_tracks,
+                    "tracks": {"data": tracks}}
+        if path.startswith("/chart"):
+            return {"data": [self.track(k, k) for k in range(1, 101)], "total": 100}
+        if path.startswith("/search"):
+            q = query.get("q", [""])[0]
+            seed = sum(q.encode("utf-8")) or 1
+            return {"data": [dict(self.track(seed * 100 + k, k), title=f"{q} {k}") for k in range(25)], "total": 25}
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    stub = None
+    protocol_version = "HTTP/1.1"
+    # Sin esto, cabeceras y cuerpo en escrituras separadas suman ~40 ms por ACK retardado
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.stub.count()
+        if self.stub.config.delay:
+            time.sleep(self.stub.config.delay)
+        url = urlparse(self.path)
+        if url.path.startswith("/cover/"):
+            return self._send(COVER_BYTES, content_type="image/jpeg")
+        if url.path.startswith("/preview/"):
+            return self._send(PREVIEW_BYTES, content_type="audio/mpeg")
+        data = self.stub.route(url.path, parse_qs(url.query))
+        if data is None:
+            # Deezer responde 200 con el error en el cuerpo
+            return self._send({"error": {"type": "DataException", "message": "no data", "code": 800}})
+        self._send(data)
+
+    def do_POST(self):
+        # Subida de qu.ax: se consume el cuerpo y se responde como qu.ax
+        remaining = int(self.headers.get("Content-Length", 0))
+        received = 0
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            received += len(chunk)
+            remaining -= len(chunk)
+        self.stub.count(uploaded=received)
+        self._send({"success": True, "files": [{"url": f"{self.stub.url}/files/{self.stub.uploads}.zip"}]})
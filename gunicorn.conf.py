@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# WORKER_CLASS=gthread (por defecto): un hilo por petición.
+# WORKER_CLASS=gevent: cada petición es un greenlet y la E/S con Deezer es
+# cooperativa, así que un worker atiende miles de consultas de metadatos a
+# la vez. Las descargas delegan su trabajo bloqueante en hilos nativos
+# (services/offload.py).
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = os.environ.get("WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("THREADS", 8))
+# Conexiones simultáneas por worker en modo gevent
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+if worker_class == "gevent":
+    # Un único cliente HTTP por worker compartido por todos los greenlets:
+    # el pool de conexiones a Deezer tiene que ser acorde
+    os.environ.setdefault("DEEZER_POOL_SIZE", "200")
+    os.environ.setdefault("DEEZER_FANOUT_WORKERS", "64")
@@ -1,25 +1,27 @@
 # api/routes/album.py o search.py
 
-from flask import Blueprint, jsonify
-import requests
+from flask import Blueprint, jsonify, request
+from services.batch import BATCH_MAX_IDS, fetch_batch, parse_ids
+from services.cache import TTL
+from services.deezer_client import get_json, handle_deezer_errors
+from services.responses import cached_json
 
 album_bp = Blueprint('album', __name__)
 
+@album_bp.route('/batch', methods=['GET'])
+def obtener_albumes_por_lote():
+    # /album/batch?ids=1,2,3 -> resultados en el mismo orden, con error por elemento
+    ids = parse_ids(request.args.get('ids'))
+    if ids is None:
+        return jsonify({"error": f"Se requiere 'ids' con hasta {BATCH_MAX_IDS} IDs numéricos separados por comas"}), 400
+
+    resultados = fetch_batch("album", ids, TTL["album"])
+    return jsonify({"data": resultados, "total": len(resultados)})
+
 @album_bp.route('/<id_album>', methods=['GET'])
+@handle_deezer_errors("Error al obtener datos del álbum", not_found_msg="Álbum no encontrado")
 def obtener_album_por_id(id_album):
-    try:
-        # Hacer la solicitud a la API de Deezer
-        url = f"https://api.deezer.com/album/{id_album}" 
-        response = requests.get(url)
-        response.raise_for_status()  # Lanza error si hay código 4xx o 5xx
-        album_data = response.json()
-
-        return jsonify(album_data)
+    # Hacer la solicitud a la API de Deezer
+    album_data = get_json(f"album/{id_album}", ttl=TTL["album"], stale=True)
 
-    except requests.exceptions.HTTPError as err:
-        if response.status_code == 404:
-            return jsonify({"error": "Álbum no encontrado"}), 404
-        else:
-            return jsonify({"error": "Error al obtener datos del álbum", "detalle": str(err)}), 500
-    except Exception as e:
-        return jsonify({"error": "Ocurrió un problema interno", "detalle": str(e)}), 500
\ No newline at end of file
+    return cached_json(album_data, TTL["album"])
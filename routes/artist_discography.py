@@ -1,43 +1,69 @@
-from flask import Blueprint, jsonify
-import requests
+from flask import Blueprint, jsonify, request
+from services.cache import TTL
+from services.deezer_client import get_all_pages, handle_deezer_errors
 
 artist_discography_bp = Blueprint('artist-discography', __name__)
 
+# Campos por los que se puede ordenar en el servidor
+SORT_FIELDS = {'release_date', 'title', 'fans', 'nb_tracks'}
+RECORD_TYPES = {'album', 'single', 'ep', 'compile'}
+
+
+def dedupe_by_id(items, seen):
+    unicos = []
+    for item in items:
+        if item.get("id") in seen:
+            continue
+        seen.add(item.get("id"))
+        unicos.append(item)
+    return unicos
+
+
+def sort_key(field):
+    def key(item):
+        value = item.get(field)
+        if value is None:
+            return (1, "")
+        return (0, value.lower() if isinstance(value, str) else value)
+    return key
+
+
 @artist_discography_bp.route('/<int:artist_id>/albums', methods=['GET'])
+@handle_deezer_errors("Error al obtener datos del artista", not_found_msg="Artista o datos no encontrados")
 def obtener_albumes_y_singles(artist_id):
-    try:
-        # URLs para obtener álbumes y singles del artista
-        albums_url = f"https://api.deezer.com/artist/{artist_id}/albums?limit=999"
-        singles_url = f"https://api.deezer.com/artist/{artist_id}/singles?limit=999" 
-
-        # Hacer las dos peticiones en paralelo
-        albums_response = requests.get(albums_url)
-        singles_response = requests.get(singles_url)
-
-        # Lanzar error si alguna falla
-        albums_response.raise_for_status()
-        singles_response.raise_for_status()
-
-        # Parsear JSON
-        albums_data = albums_response.json()
-        singles_data = singles_response.json()
-
-        return jsonify({
-            "albums": albums_data.get("data", []),
-            "singles": singles_data.get("data", [])
-        })
-
-    except requests.exceptions.HTTPError as err:
-        if "404" in str(err):
-            return jsonify({"error": "Artista o datos no encontrados"}), 404
-        else:
-            return jsonify({
-                "error": "Error al obtener datos del artista",
-                "detalle": str(err)
-            }), 500
-
-    except Exception as e:
-        return jsonify({
-            "error": "Ocurrió un problema interno",
-            "detalle": str(e)
-        }), 500
\ No newline at end of file
+    # Parámetros opcionales: ?sort=release_date&order=desc&type=album,ep&limit=50
+    sort = request.args.get('sort')
+    order = request.args.get('order', 'desc' if sort in ('release_date', 'fans') else 'asc')
+    types = request.args.get('type')
+    limit = request.args.get('limit', type=int)
+
+    if sort and sort not in SORT_FIELDS:
+        return jsonify({"error": f"'sort' debe ser uno de: {', '.join(sorted(SORT_FIELDS))}"}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "'order' debe ser 'asc' o 'desc'"}), 400
+    types = {t.strip() for t in types.split(",")} if types else None
+    if types and not types <= RECORD_TYPES:
+        return jsonify({"error": f"'type' debe contener: {', '.join(sorted(RECORD_TYPES))}"}), 400
+
+    # Álbumes y singles en paralelo, con todas sus páginas
+    albums, singles = get_all_pages(
+        [f"artist/{artist_id}/albums", f"artist/{artist_id}/singles"],
+        ttl=TTL["discography"]
+    )
+
+    # Sin duplicados; un single que ya aparece entre los álbumes no se repite
+    seen = set()
+    albums = dedupe_by_id(albums, seen)
+    singles = dedupe_by_id(singles, seen)
+
+    resultado = {"albums": albums, "singles": singles}
+    for name, items in resultado.items():
+        if types:
+            items = [item for item in items if item.get("record_type") in types]
+        if sort:
+            items = sorted(items, key=sort_key(sort), reverse=(order == 'desc'))
+        if limit and limit > 0:
+            items = items[:limit]
+        resultado[name] = items
+
+    return jsonify(resultado)
@@ -1,26 +1,21 @@
 # api/routes/charts.py
-from flask import Blueprint, jsonify
-import requests
+from flask import Blueprint
+from services import previews
+from services.cache import TTL
+from services.deezer_client import get_json, handle_deezer_errors
+from services.responses import cached_json
 
 chart_bp = Blueprint('chart', __name__)
 
 
 @chart_bp.route('/', methods=['GET'])
+@handle_deezer_errors("Error al obtener los datos del chart", not_found_msg="No se encontraron datos")
 def obtener_top_global_canciones():
-    try:
-        # URL del top global de canciones
-        url = "https://api.deezer.com/chart/0/tracks" 
+    # Top global de canciones; el prewarmer lo mantiene fresco y, si no,
+    # se sirve la última copia mientras se refresca
+    data = get_json("chart/0/tracks", ttl=TTL["chart"], stale=True)
+    # Los clientes reproducen los previews del chart: se guardan sus URLs y
+    # sus clips se quedan en memoria
+    previews.remember(data.get("data", []), hot=True)
 
-        response = requests.get(url)
-        response.raise_for_status()  # Lanza error si hay código HTTP != 2xx
-        data = response.json()
-
-        return jsonify(data)
-
-    except requests.exceptions.HTTPError as err:
-        if response.status_code == 404:
-            return jsonify({"error": "No se encontraron datos", "detalle": str(err)}), 404
-        else:
-            return jsonify({"error": "Error al obtener los datos del chart", "detalle": str(err)}), 500
-    except Exception as e:
-        return jsonify({"error": "Ocurrió un problema interno", "detalle": str(e)}), 500
\ No newline at end of file
+    return cached_json(data, TTL["chart"])
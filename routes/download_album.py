@@ -1,27 +1,30 @@
 import os
 import shutil
 import tempfile
-import requests
-import zipfile
-from arl import arl_token
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, jsonify, request
-from deezspot.deezloader import DeeLogin
-from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK, TYER, APIC
-from mutagen.easyid3 import EasyID3
+from services.archive import StreamingZip
+from services.cache import TTL
+from services.checkpoint import Checkpoint
+from services import jobs, metrics, storage
+from services.config import DOWNLOAD_DIR
+from services.deezer_client import DeezerAPIError, get_json
+from services.publisher import get_publisher
+from services.tagger import tag_track
+from services.track_downloader import ALBUM_TRACK_WORKERS, obtain_track
 import logging
 
 # Configura logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-DOWNLOAD_DIR = './downloads'
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-DEEZER_API_ALBUM = "https://api.deezer.com/album/"
+DEEZER_API_ALBUM = "album/"
 TMPFILES_API = "https://tmpfiles.org/api/v1/upload"
 
-deezer = DeeLogin(arl=arl_token)
+# Subcarpeta con los directorios de descarga aislados de cada pista
+STAGING_DIR = ".tracks"
 
 download_album_bp = Blueprint('download-album', __name__)
 
@@ -30,131 +33,31 @@ def sanitize_filename(name):
 
 def get_album_metadata(album_id):
     logger.info(f"Obteniendo metadatos del álbum {album_id}")
-    response = requests.get(f"{DEEZER_API_ALBUM}{album_id}")
-    if response.status_code != 200:
-        logger.error(f"Error al obtener metadatos. Status: {response.status_code}")
+    try:
+        return get_json(f"{DEEZER_API_ALBUM}{album_id}", ttl=TTL["album"])
+    except DeezerAPIError as e:
+        logger.error(f"Error al obtener metadatos. Status: {e.status_code}")
         raise Exception("Error al obtener metadatos del álbum")
-    return response.json()
 
-def add_metadata_to_mp3(file_path, track, album_data, track_number):
+def album_cost():
+    # Coste en el rate limiter: una unidad por pista del álbum
+    album_id = request.args.get('album_id')
+    if not album_id or not album_id.isdigit():
+        return 1
     try:
-        try:
-            audio = EasyID3(file_path)
-        except:
-            audio = EasyID3()
-            audio.save(file_path)
-            audio = EasyID3(file_path)
-
-        # Manejar artistas
-        contributors = track.get("contributors", [])
-        artists = [artist["name"] for artist in contributors] if contributors else [track.get("artist", {}).get("name", "Unknown")]
-        artist_str = ", ".join(artists)
-
-        # Usamos el track_number pasado como parámetro (basado en el índice del bucle)
-        track_num_str = str(track_number)
-
-        # Añadir metadatos básicos
-        audio["title"] = track.get("title", "Unknown Title")
-        audio["artist"] = artist_str
-        audio["album"] = album_data.get("title", "Unknown Album")
-        audio["tracknumber"] = track_num_str
-        audio["date"] = album_data.get("release_date", "").split("-")[0]
-
-        audio.save(file_path)
-        logger.info(f"Metadatos añadidos a {file_path} - Track: {track_num_str}")
-
-        # Añadir portada del álbum
-        try:
-            id3 = ID3(file_path)
-            cover_url = album_data.get("cover_xl") or album_data.get("cover_big")
-            if cover_url:
-                cover_data = requests.get(cover_url).content
-                id3.add(
-                    APIC(
-                        encoding=3,
-                        mime="image/jpeg",
-                        type=3,
-                        desc="Cover",
-                        data=cover_data
-                    )
-                )
-                id3.save(v2_version=3)
-                logger.info(f"Portada añadida a {file_path}")
-        except Exception as e:
-            logger.error(f"Error añadiendo portada: {e}")
+        album_data = get_json(f"{DEEZER_API_ALBUM}{album_id}", ttl=TTL["album"])
+    except DeezerAPIError:
+        return 1
+    return max(1, len(album_data.get("tracks", {}).get("data", [])))
 
-    except Exception as e:
-        logger.error(f"Error en add_metadata_to_mp3: {str(e)}")
-        raise
+def finish_zip(archive):
+    if archive.file_count == 0:
+        archive.abort()
+        raise Exception("No se encontraron archivos para comprimir")
 
-def upload_to_quax(zip_data, filename):
-    try:
-        logger.info(f"Subiendo {filename} ({len(zip_data)} bytes) a qu.ax")
-        
-        if len(zip_data) == 0:
-            raise Exception("El archivo ZIP está vacío")
-        
-        # Crear un objeto BytesIO para el archivo en memoria
-        file_obj = BytesIO(zip_data)
-        files = {'files[]': (filename, file_obj, 'application/zip')}
-        
-        response = requests.post(
-            "https://qu.ax/upload.php",
-            files=files,
-            data={'expiry': '30'},
-            headers={
-                "User-Agent": "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Mobile Safari/537.36",
-                "Referer": "https://qu.ax/"
-            }
-        )
-        response.raise_for_status()
-        
-        json_response = response.json()
-        
-        # Verificar la estructura de la respuesta
-        if not json_response.get('success') or not json_response.get('files') or len(json_response['files']) == 0:
-            logger.error(f"Respuesta inesperada de qu.ax: {json_response}")
-            raise Exception("La estructura de la respuesta no es la esperada")
-        
-        # Obtener la URL de descarga
-        download_url = json_response['files'][0]['url']
-        
-        logger.info(f"Subida exitosa a qu.ax. URL: {download_url}")
-        return {
-            'download_url': download_url,
-            'delete_url': ''  # qu.ax no parece proporcionar URL de eliminación
-        }
-    except Exception as e:
-        logger.error(f"Error subiendo a qu.ax: {str(e)}")
-        raise
-
-def create_zip_file(folder_path):
-    try:
-        # Crear un archivo ZIP en memoria
-        zip_buffer = BytesIO()
-        
-        file_count = 0
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # Mantener la estructura de directorios dentro del ZIP
-                    arcname = os.path.join(os.path.basename(folder_path), os.path.relpath(file_path, folder_path))
-                    zipf.write(file_path, arcname)
-                    file_count += 1
-                    logger.debug(f"Añadido al ZIP: {file_path} como {arcname}")
-        
-        if file_count == 0:
-            raise Exception("No se encontraron archivos para comprimir")
-        
-        zip_data = zip_buffer.getvalue()
-        logger.info(f"ZIP creado con {file_count} archivos ({len(zip_data)} bytes)")
-        
-        return zip_data
-    except Exception as e:
-        logger.error(f"Error creando ZIP: {str(e)}")
-        raise
+    zip_path = archive.close()
+    logger.info(f"ZIP creado con {archive.file_count} archivos ({os.path.getsize(zip_path)} bytes)")
+    return zip_path
 
 def cleanup_folder(folder_path):
     try:
@@ -165,6 +68,163 @@ def cleanup_folder(folder_path):
         logger.error(f"Error limpiando carpeta: {str(e)}")
         raise
 
+def process_track(job, idx, total, track, album_data, folder_path, staging_root, archive, checkpoint):
+    logger.info(f"[{idx}/{total}] Procesando: {track.get('title')}")
+    new_file_name = f"{idx:02d}. {sanitize_filename(track['title'])}.mp3"
+    new_file_path = os.path.join(folder_path, new_file_name)
+
+    # Terminada en un intento anterior y sin cambios en disco
+    if checkpoint.completed_track(track["id"], new_file_path):
+        logger.info(f"[{idx}/{total}] Ya completada en un intento anterior")
+        archive.add(new_file_path, os.path.join(os.path.basename(folder_path), new_file_name))
+        job.track(idx, "done", song_id=track["id"], title=track.get("title"), file=new_file_name, resumed=True)
+        return new_file_name
+
+    job.track(idx, "downloading", song_id=track["id"], title=track.get("title"))
+    # Cada pista tiene su propio directorio de descarga
+    staging_dir = os.path.join(staging_root, f"{idx:02d}-{track['id']}")
+
+    def tag(file_path):
+        # Añadir metadatos - pasamos el índice como número de track
+        job.track(idx, "tagging")
+        logger.info(f"Añadiendo metadatos a {file_path}")
+        tag_track(file_path, track, album_data, idx)
+
+    try:
+        file_path, from_store = obtain_track(track["id"], new_file_path, staging_dir, tag)
+    except Exception as e:
+        job.track(idx, "failed", error=str(e))
+        checkpoint.track_failed(track["id"], str(e))
+        raise
+    if not file_path:
+        logger.warning(f"[{idx}/{total}] No se pudo descargar: {track.get('title')}")
+        job.track(idx, "failed", error="Descarga vacía")
+        checkpoint.track_failed(track["id"], "Descarga vacía")
+        return None
+
+    logger.info(f"Pista lista en: {new_file_path}" + (" (almacén)" if from_store else ""))
+    checkpoint.track_done(track["id"], new_file_path)
+
+    # Se añade al ZIP en cuanto está lista
+    archive.add(new_file_path, os.path.join(os.path.basename(folder_path), new_file_name))
+    job.track(idx, "done", file=new_file_name, cached=from_store)
+    return new_file_name
+
+def upload_progress(job):
+    # Informa del avance de la subida cada 5%
+    last = [-1]
+    def report(sent, total):
+        percent = int(sent * 100 / total) if total else 100
+        if percent // 5 != last[0] // 5:
+            last[0] = percent
+            job.update(upload={"sent": sent, "total": total, "percent": percent})
+    return report
+
+def build_album(job):
+    # Trabajo en segundo plano: descarga, etiqueta, comprime y publica
+    album_id = job.params["album_id"]
+    storage.ensure_space()
+
+    # 1. Obtener metadatos del álbum
+    job.update(stage="metadata")
+    with metrics.stage("album", "metadata"):
+        album_data = get_album_metadata(album_id)
+    logger.info(f"Álbum: {album_data.get('title')} - Artista: {album_data.get('artist', {}).get('name')}")
+
+    artist_name = album_data["artist"]["name"]
+    album_title = album_data["title"]
+    release_year = album_data["release_date"].split("-")[0]
+
+    # Crear nombre de carpeta seguro
+    safe_artist = sanitize_filename(artist_name)
+    safe_album = sanitize_filename(album_title)
+    folder_name = f"{safe_artist} - {safe_album} ({release_year})"
+    folder_path = os.path.join(DOWNLOAD_DIR, folder_name)
+    os.makedirs(folder_path, exist_ok=True)
+    logger.info(f"Carpeta de descarga: {folder_path}")
+
+    zip_file_name = f"{folder_name}.zip"
+    zip_path = os.path.join(DOWNLOAD_DIR, f".{zip_file_name}")
+    part_path = f"{zip_path}.part"
+    # Progreso de intentos anteriores, junto a la carpeta
+    checkpoint_path = os.path.join(DOWNLOAD_DIR, f"{folder_name}.checkpoint.json")
+
+    # El barrido de disco no toca la carpeta, el ZIP ni el manifiesto mientras se usan
+    with storage.downloads.lease(folder_path, zip_path, part_path, checkpoint_path):
+        tracks = album_data.get("tracks", {}).get("data", [])
+        if not tracks:
+            raise Exception("Este álbum no tiene pistas disponibles")
+
+        checkpoint = Checkpoint(checkpoint_path, f"album:{album_id}")
+        if checkpoint.resumed:
+            logger.info(f"Reanudando el álbum {album_id} desde el intento anterior")
+            job.update(resumed=True)
+
+        if checkpoint.completed_archive(zip_path, [track["id"] for track in tracks]):
+            # Solo falló la publicación: se vuelve a subir el mismo ZIP
+            logger.info(f"ZIP ya construido en un intento anterior: {zip_file_name}")
+        else:
+            # 2. Descargar pistas
+            logger.info(f"Descargando {len(tracks)} pistas...")
+            job.update(stage="download", total=len(tracks), completed=0)
+            staging_root = os.path.join(folder_path, STAGING_DIR)
+
+            # 3. El ZIP se escribe en disco a medida que terminan las pistas
+            logger.info(f"Creando archivo ZIP: {zip_file_name}")
+            archive = StreamingZip(part_path)
+
+            # Las pistas se descargan en paralelo y se recogen en orden de
+            # pista; un fallo no cancela las demás, que quedan en el manifiesto
+            try:
+                workers = max(1, min(ALBUM_TRACK_WORKERS, len(tracks)))
+                with metrics.stage("album", "tracks"), ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [
+                        pool.submit(process_track, job, idx, len(tracks), track, album_data, folder_path, staging_root, archive, checkpoint)
+                        for idx, track in enumerate(tracks, start=1)
+                    ]
+                errors = [future.exception() for future in futures if future.exception()]
+                if errors:
+                    raise errors[0]
+            except Exception:
+                archive.abort()
+                raise
+
+            shutil.rmtree(staging_root, ignore_errors=True)
+            archived = [track["id"] for track, future in zip(tracks, futures) if future.result()]
+
+            job.update(stage="zip")
+            with metrics.stage("album", "zip"):
+                finish_zip(archive)
+                os.replace(part_path, zip_path)
+                checkpoint.archive_done(zip_path, archived)
+
+        # 4. Subir a qu.ax; si falla, el ZIP y el manifiesto se conservan
+        job.update(stage="upload")
+        logger.info("Subiendo a qu.ax...")
+        with metrics.stage("album", "upload"):
+            upload_response = get_publisher().publish(zip_path, zip_file_name, progress=upload_progress(job))
+
+        # 5. Limpiar
+        os.remove(zip_path)
+        cleanup_folder(folder_path)
+        checkpoint.delete()
+
+    # 6. Resultado final del trabajo
+    logger.info("Proceso completado exitosamente")
+    job.update(stage="done")
+    return {
+        "status": "success",
+        "download_url": upload_response['download_url'],
+        "delete_url": upload_response.get('delete_url', ''),
+        "filename": zip_file_name,
+        "album": album_title,
+        "artist": artist_name,
+        "year": release_year,
+        "message": "Álbum descargado y comprimido con éxito"
+    }
+
+jobs.register_handler("album", build_album)
+
 @download_album_bp.route('/', methods=['GET'])
 def download_album():
     album_id = request.args.get('album_id')
@@ -175,92 +235,23 @@ def download_album():
         return jsonify({"error": "Se requiere un ID de álbum válido (número)"}), 400
 
     try:
-        # 1. Obtener metadatos del álbum
+        # Validar el álbum antes de encolar (los metadatos quedan en caché)
         album_data = get_album_metadata(album_id)
-        logger.info(f"Álbum: {album_data.get('title')} - Artista: {album_data.get('artist', {}).get('name')}")
-
-        artist_name = album_data["artist"]["name"]
-        album_title = album_data["title"]
-        release_year = album_data["release_date"].split("-")[0]
-
-        # Crear nombre de carpeta seguro
-        safe_artist = sanitize_filename(artist_name)
-        safe_album = sanitize_filename(album_title)
-        folder_name = f"{safe_artist} - {safe_album} ({release_year})"
-        folder_path = os.path.join(DOWNLOAD_DIR, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        logger.info(f"Carpeta de descarga: {folder_path}")
-
-        # 2. Descargar pistas
-        tracks = album_data.get("tracks", {}).get("data", [])
-        if not tracks:
+        if not album_data.get("tracks", {}).get("data"):
             logger.error("Álbum no tiene pistas disponibles")
             return jsonify({"error": "Este álbum no tiene pistas disponibles"}), 400
 
-        logger.info(f"Descargando {len(tracks)} pistas...")
-        downloaded_files = []
-
-        for idx, track in enumerate(tracks, start=1):
-            song_id = track["id"]
-            track_url = f"https://www.deezer.com/track/{song_id}"
-            logger.info(f"[{idx}/{len(tracks)}] Procesando: {track.get('title')}")
-
-            # Descargar pista
-            deezer.download_trackdee(
-                link_track=track_url,
-                output_dir=folder_path,
-                quality_download='MP3_128',
-                recursive_quality=True,
-                recursive_download=False
-            )
-
-            # Procesar archivo descargado
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    if file.endswith(".mp3") and file not in downloaded_files:
-                        file_path = os.path.join(root, file)
-
-                        if os.path.getsize(file_path) == 0:
-                            logger.warning(f"Archivo vacío, eliminando: {file_path}")
-                            os.remove(file_path)
-                            continue
-
-                        # Añadir metadatos - pasamos el índice como número de track
-                        logger.info(f"Añadiendo metadatos a {file_path}")
-                        add_metadata_to_mp3(file_path, track, album_data, idx)
-
-                        # Renombrar archivo
-                        new_file_name = f"{idx:02d}. {sanitize_filename(track['title'])}.mp3"
-                        new_file_path = os.path.join(folder_path, new_file_name)
-                        os.rename(file_path, new_file_path)
-                        downloaded_files.append(new_file_name)
-                        logger.info(f"Archivo renombrado a: {new_file_path}")
-                        break
-
-        # 3. Crear ZIP con la carpeta completa
-        zip_file_name = f"{folder_name}.zip"
-        logger.info(f"Creando archivo ZIP: {zip_file_name}")
-        zip_data = create_zip_file(folder_path)
-
-        # 4. Subir a qu.ax
-        logger.info("Subiendo a qu.ax...")
-        upload_response = upload_to_quax(zip_data, zip_file_name)
-
-        # 5. Limpiar
-        cleanup_folder(folder_path)
-
-        # 6. Respuesta exitosa
-        logger.info("Proceso completado exitosamente")
+        # Las peticiones idénticas en curso se unen al mismo trabajo
+        job, created = jobs.submit("album", f"album:{album_id}", {"album_id": album_id})
+        status_url = f"/jobs/{job['job_id']}"
         return jsonify({
-            "status": "success",
-            "download_url": upload_response['download_url'],
-            "delete_url": upload_response.get('delete_url', ''),
-            "filename": zip_file_name,
-            "album": album_title,
-            "artist": artist_name,
-            "year": release_year,
-            "message": "Álbum descargado y comprimido con éxito"
-        })
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": status_url,
+            "album": album_data.get("title"),
+            "artist": album_data.get("artist", {}).get("name"),
+            "message": "Descarga del álbum en proceso" if created else "El álbum ya se está procesando"
+        }), 202, {"Location": status_url}
 
     except Exception as e:
         logger.error(f"Error procesando álbum: {str(e)}", exc_info=True)
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, jsonify, request
+from routes.download_album import STAGING_DIR, finish_zip, sanitize_filename, upload_progress
+from services.archive import StreamingZip
+from services.cache import TTL
+from services import jobs, metrics, storage
+from services.config import DOWNLOAD_DIR
+from services.deezer_client import DeezerAPIError, get_json, iter_pages
+from services.publisher import get_publisher
+from services.tagger import tag_track
+from services.track_downloader import ALBUM_TRACK_WORKERS, obtain_track
+
+logger = logging.getLogger(__name__)
+
+os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+# Estado de la última sincronización, dentro de la carpeta de la playlist
+MANIFEST_NAME = "manifest.json"
+
+download_playlist_bp = Blueprint('download-playlist', __name__)
+
+def get_playlist_tracks(playlist_id):
+    # Metadatos y todas las pistas (las incluidas y el resto de páginas)
+    logger.info(f"Obteniendo metadatos de la playlist {playlist_id}")
+    try:
+        playlist = get_json(f"playlist/{playlist_id}", ttl=TTL["playlist"])
+        tracks = list(playlist.get("tracks", {}).get("data", []))
+        total = playlist.get("nb_tracks") or 0
+        if total > len(tracks):
+            for page in iter_pages(f"playlist/{playlist_id}/tracks", len(tracks), total, ttl=TTL["playlist"]):
+                tracks.extend(page)
+    except DeezerAPIError as e:
+        logger.error(f"Error al obtener la playlist. Status: {e.status_code}")
+        raise Exception("Error al obtener metadatos de la playlist")
+
+    # Una pista repetida en la playlist se descarga una vez; las que Deezer
+    # marca como no disponibles no se intentan
+    seen = set()
+    unique = []
+    for track in tracks:
+        if track.get("id") in seen or not track.get("readable", True):
+            continue
+        seen.add(track["id"])
+        unique.append(track)
+    return playlist, unique
+
+def playlist_folder(playlist_id):
+    # Solo el id: si la playlist cambia de título se sigue usando la misma
+    # carpeta y el mismo manifiesto
+    return os.path.join(DOWNLOAD_DIR, f"playlist-{playlist_id}")
+
+def archive_name(playlist_id, playlist):
+    # Nombre legible para el ZIP y su carpeta interna
+    return f"{sanitize_filename(playlist.get('title', 'Playlist'))} ({playlist_id})"
+
+def track_file_name(position, track):
+    artist = track.get("artist", {}).get("name", "Unknown Artist")
+    return f"{position:03d}. {sanitize_filename(artist)} - {sanitize_filename(track.get('title', 'Unknown Title'))}.mp3"
+
+def load_manifest(folder_path):
+    try:
+        with open(os.path.join(folder_path, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_manifest(folder_path, manifest):
+    path = os.path.join(folder_path, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def plan_sync(folder_path, tracks, manifest):
+    # Compara la playlist con la última sincronización: las pistas que ya
+    # están en la carpeta se conservan (renombradas si cambió su posición),
+    # las que ya no están en la playlist se borran y el resto se descarga
+    previous = {entry["id"]: entry for entry in manifest.get("tracks", [])}
+    current_ids = {track["id"] for track in tracks}
+    kept, missing, moves = [], [], []
+
+    for position, track in enumerate(tracks, start=1):
+        file_name = track_file_name(position, track)
+        entry = previous.get(track["id"])
+        if entry and os.path.exists(os.path.join(folder_path, entry["file"])):
+            if entry["file"] != file_name:
+                moves.append((entry["file"], file_name))
+            kept.append((position, track, file_name))
+        else:
+            missing.append((position, track, file_name))
+
+    removed = [entry for entry_id, entry in previous.items() if entry_id not in current_ids]
+    return kept, missing, moves, removed
+
+def apply_moves(folder_path, moves, removed):
+    for entry in removed:
+        path = os.path.join(folder_path, entry["file"])
+        if os.path.exists(path):
+            os.remove(path)
+    # En dos pasos: un nombre nuevo puede ser el antiguo de otra pista
+    staged = []
+    for old_name, new_name in moves:
+        tmp_path = os.path.join(folder_path, f".{new_name}.move.tmp")
+        os.replace(os.path.join(folder_path, old_name), tmp_path)
+        staged.append((tmp_path, os.path.join(folder_path, new_name)))
+    for tmp_path, new_path in staged:
+        os.replace(tmp_path, new_path)
+
+def sync_track(job, position, track, folder_path, staging_root):
+    job.track(position, "downloading", song_id=track["id"], title=track.get("title"))
+    file_path = os.path.join(folder_path, track_file_name(position, track))
+    staging_dir = os.path.join(staging_root, f"{position:03d}-{track['id']}")
+
+    def tag(downloaded_path):
+        # La pista de una playlist trae un álbum resumido (sin fecha) y no
+        # trae track_position; el archivo va al almacén compartido, así que
+        # se etiqueta con los datos completos de la pista, como en un álbum
+        job.track(position, "tagging")
+        full_track = get_json(f"track/{track['id']}", ttl=TTL["track"])
+        tag_track(downloaded_path, full_track, full_track.get("album", {}))
+
+    try:
+        result, from_store = obtain_track(track["id"], file_path, staging_dir, tag)
+    except Exception as e:
+        # Una pista que falla no detiene la playlist; se reintenta en la
+        # siguiente sincronización
+        logger.warning(f"[{position}] No se pudo descargar {track.get('title')}: {e}")
+        job.track(position, "failed", error=str(e))
+        return None
+    if not result:
+        job.track(position, "failed", error="Descarga vacía")
+        return None
+    job.track(position, "done", cached=from_store)
+    return position
+
+def build_playlist(job):
+    # Trabajo en segundo plano: sincroniza, comprime y publica
+    playlist_id = job.params["playlist_id"]
+    storage.ensure_space()
+
+    # 1. Metadatos y lista completa de pistas
+    job.update(stage="metadata")
+    with metrics.stage("playlist", "metadata"):
+        playlist, tracks = get_playlist_tracks(playlist_id)
+    if not tracks:
+        raise Exception("Esta playlist no tiene pistas disponibles")
+
+    folder_path = playlist_folder(playlist_id)
+    folder_name = archive_name(playlist_id, playlist)
+    os.makedirs(folder_path, exist_ok=True)
+    zip_file_name = f"{folder_name}.zip"
+    zip_path = os.path.join(DOWNLOAD_DIR, f".{zip_file_name}.part")
+
+    with storage.downloads.lease(folder_path), storage.downloads.lease(zip_path):
+        # 2. Diferencias con la sincronización anterior
+        kept, missing, moves, removed = plan_sync(folder_path, tracks, load_manifest(folder_path))
+        apply_moves(folder_path, moves, removed)
+        logger.info(f"Playlist {playlist_id}: {len(kept)} conservadas, {len(missing)} nuevas, {len(removed)} eliminadas")
+
+        # 3. Solo se descargan las que faltan
+        job.update(stage="download", total=len(missing), completed=0, kept=len(kept), removed=len(removed))
+        staging_root = os.path.join(folder_path, STAGING_DIR)
+        downloaded = []
+        if missing:
+            workers = max(1, min(ALBUM_TRACK_WORKERS, len(missing)))
+            with metrics.stage("playlist", "tracks"), ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(sync_track, job, position, track, folder_path, staging_root)
+                    for position, track, _ in missing
+                ]
+                downloaded = {future.result() for future in futures} - {None}
+        shutil.rmtree(staging_root, ignore_errors=True)
+
+        synced = sorted(kept + [item for item in missing if item[0] in downloaded], key=lambda item: item[0])
+        failed = [track["id"] for position, track, _ in missing if position not in downloaded]
+        manifest = {
+            "playlist_id": int(playlist_id),
+            "title": playlist.get("title"),
+            "checksum": playlist.get("checksum"),
+            "synced_at": int(time.time()),
+            "tracks": [
+                {"position": position, "id": track["id"], "title": track.get("title"),
+                 "artist": track.get("artist", {}).get("name"), "file": file_name}
+                for position, track, file_name in synced
+            ],
+        }
+        save_manifest(folder_path, manifest)
+        if not synced:
+            # Un ZIP con solo el manifiesto no es un resultado
+            raise Exception("No se pudo descargar ninguna pista de la playlist")
+
+        # 4. ZIP con la playlist completa y el manifiesto
+        job.update(stage="zip")
+        with metrics.stage("playlist", "zip"):
+            archive = StreamingZip(zip_path)
+            try:
+                for _, _, file_name in synced:
+                    archive.add(os.path.join(folder_path, file_name), os.path.join(folder_name, file_name))
+                archive.add_bytes(json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+                                  os.path.join(folder_name, MANIFEST_NAME))
+            except Exception:
+                archive.abort()
+                raise
+            finish_zip(archive)
+
+        # 5. Publicar
+        job.update(stage="upload")
+        try:
+            with metrics.stage("playlist", "upload"):
+                upload_response = get_publisher().publish(zip_path, zip_file_name, progress=upload_progress(job))
+        finally:
+            os.remove(zip_path)
+
+    job.update(stage="done")
+    return {
+        "status": "success",
+        "download_url": upload_response['download_url'],
+        "delete_url": upload_response.get('delete_url', ''),
+        "filename": zip_file_name,
+        "playlist": playlist.get("title"),
+        "tracks": len(synced),
+        "added": len(downloaded),
+        "kept": len(kept),
+        "removed": len(removed),
+        "failed": failed,
+        "message": "Playlist sincronizada y comprimida con éxito"
+    }
+
+jobs.register_handler("playlist", build_playlist)
+
+def playlist_cost():
+    # Coste en el rate limiter: aproximadamente una unidad por pista que
+    # falta en la carpeta. Solo con el documento de la playlist (en caché y
+    # el mismo que pide la ruta) y el manifiesto; sin paginar ni recorrer
+    # la carpeta, que ya lo hace el trabajo
+    playlist_id = request.args.get('playlist_id')
+    if not playlist_id or not playlist_id.isdigit():
+        return 1
+    try:
+        playlist = get_json(f"playlist/{playlist_id}", ttl=TTL["playlist"])
+    except Exception:
+        return 1
+    synced = len(load_manifest(playlist_folder(playlist_id)).get("tracks", []))
+    return max(1, (playlist.get("nb_tracks") or 0) - synced)
+
+@download_playlist_bp.route('/', methods=['GET'])
+def download_playlist():
+    playlist_id = request.args.get('playlist_id')
+    logger.info(f"Iniciando sincronización para playlist_id: {playlist_id}")
+
+    if not playlist_id or not playlist_id.isdigit():
+        return jsonify({"error": "Se requiere un ID de playlist válido (número)"}), 400
+
+    try:
+        # Validar la playlist antes de encolar (los metadatos quedan en caché)
+        playlist = get_json(f"playlist/{playlist_id}", ttl=TTL["playlist"])
+        if not playlist.get("nb_tracks") and not playlist.get("tracks", {}).get("data"):
+            return jsonify({"error": "Esta playlist no tiene pistas disponibles"}), 400
+
+        job, created = jobs.submit("playlist", f"playlist:{playlist_id}", {"playlist_id": playlist_id})
+        status_url = f"/jobs/{job['job_id']}"
+        return jsonify({
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": status_url,
+            "playlist": playlist.get("title"),
+            "nb_tracks": playlist.get("nb_tracks"),
+            "message": "Sincronización de la playlist en proceso" if created else "La playlist ya se está procesando"
+        }), 202, {"Location": status_url}
+
+    except DeezerAPIError as e:
+        logger.error(f"Error obteniendo la playlist: {e}")
+        return jsonify({"error": "No se pudo obtener la playlist"}), 404 if e.status_code == 404 else 500
+    except Exception as e:
+        logger.error(f"Error procesando playlist: {str(e)}", exc_info=True)
+        return jsonify({
+            "error": str(e),
+            "message": "Ocurrió un error al procesar la playlist"
+        }), 500
@@ -0,0 +1,15 @@
+# routes/jobs.py
+from flask import Blueprint, jsonify
+from services import jobs
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def obtener_estado_trabajo(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+
+    # Los parámetros internos no se exponen
+    job.pop("params", None)
+    return jsonify(job)
@@ -1,10 +1,11 @@
 # api/routes/playlist.py
 from flask import Blueprint, request, jsonify
-import requests
+from services.deezer_client import get_json, handle_deezer_errors
 
 playlist_bp = Blueprint('playlist', __name__)
 
 @playlist_bp.route('/', methods=['GET'])
+@handle_deezer_errors("Error al conectar con la API de Deezer")
 def buscar_playlist():
     # Obtener el término de búsqueda desde los parámetros de la URL
     query = request.args.get('q')
@@ -12,21 +13,11 @@ def buscar_playlist():
     if not query:
         return jsonify({"error": "Falta el término de búsqueda 'q'"}), 400
 
-    # URL de la API de Deezer para buscar playlists
-    url = "https://api.deezer.com/search/playlist"
+    # Realizar la solicitud a la API de Deezer con límite de 50 resultados
+    params = {
+        'q': query,
+        'limit': 50
+    }
+    resultados = get_json("search/playlist", params=params)
 
-    # Realizar la solicitud a la API de Deezer con límite de 30 resultados
-    try:
-        params = {
-            'q': query,
-            'limit': 50  # Aquí se establece el límite a 30 resultados
-        }
-
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        resultados = response.json()
-
-        return jsonify(resultados)
-
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "Error al conectar con la API de Deezer", "detalle": str(e)}), 500
\ No newline at end of file
+    return jsonify(resultados)
@@ -1,23 +1,123 @@
 # routes/playlist_tracks.py
-from flask import Blueprint, request, jsonify
-import requests
+import json
+import hashlib
+import itertools
+import logging
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from services.cache import TTL
+from services.deezer_client import DEEZER_PAGE_SIZE, get_json, handle_deezer_errors, iter_pages
+
+logger = logging.getLogger(__name__)
 
 playlist_tracks_bp = Blueprint('playlist-tracks', __name__)
 
+FORMATS = ("json", "ndjson")
+
+
+def parse_fields(raw):
+    # "id,title,artist.name" -> [["id"], ["title"], ["artist", "name"]]
+    return [field.strip().split(".") for field in raw.split(",") if field.strip()]
+
+
+def project(item, fields):
+    # Copia solo los campos pedidos, respetando el anidamiento
+    if not fields:
+        return item
+    row = {}
+    for path in fields:
+        value = item
+        for part in path:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = row
+            for part in path[:-1]:
+                target = target.setdefault(part, {})
+            target[path[-1]] = value
+    return row
+
+
+def track_pages(playlist_id, playlist):
+    # Primero las pistas que Deezer incluye en /playlist/<id>; el resto se
+    # pide en paralelo a /playlist/<id>/tracks y se entrega por páginas.
+    # La primera de esas páginas se pide ya, antes de empezar la respuesta:
+    # si Deezer falla ahí es un error normal y no un documento a medias.
+    # Devuelve (páginas, completo); completo=False si aún quedan páginas
+    # por pedir y el streaming todavía puede fallar
+    embedded = playlist.get("tracks", {}).get("data", [])
+    total = playlist.get("nb_tracks") or 0
+    if total <= len(embedded):
+        return [embedded], True
+    pages = iter_pages(f"playlist/{playlist_id}/tracks", len(embedded), total, ttl=TTL["playlist"])
+    first = next(pages, [])
+    return itertools.chain([embedded, first], pages), total <= len(embedded) + DEEZER_PAGE_SIZE
+
+
+def stream_json(playlist_id, playlist, pages, fields):
+    # Mismo documento que devuelve Deezer, con tracks.data completo
+    meta = {k: v for k, v in playlist.items() if k != "tracks"}
+    head = json.dumps(meta)[:-1]
+    yield head + (", " if meta else "") + '"tracks": {"data": ['
+    count = 0
+    try:
+        for page in pages:
+            if page:
+                rows = ", ".join(json.dumps(project(track, fields)) for track in page)
+                yield (", " if count else "") + rows
+                count += len(page)
+    except Exception as e:
+        # El status ya se envió: el error va dentro del documento
+        logger.error(f"Error paginando la playlist {playlist_id}: {e}")
+        yield f'], "total": {count}, "error": {json.dumps(str(e))}}}}}'
+        return
+    yield f'], "total": {count}}}}}'
+
+
+def stream_ndjson(playlist_id, playlist, pages, fields):
+    # Primera línea: la playlist; después una pista por línea
+    meta = {k: v for k, v in playlist.items() if k != "tracks"}
+    yield json.dumps(meta) + "\n"
+    try:
+        for page in pages:
+            if page:
+                yield "".join(json.dumps(project(track, fields)) + "\n" for track in page)
+    except Exception as e:
+        logger.error(f"Error paginando la playlist {playlist_id}: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
 @playlist_tracks_bp.route('/<int:playlist_id>', methods=['GET'])
+@handle_deezer_errors("Error al conectar con la API de Deezer", not_found_msg="Playlist no encontrada")
 def obtener_tracks_playlist(playlist_id):
-    # URL de la API de Deezer para obtener las canciones de una playlist
-    url = f"https://api.deezer.com/playlist/{playlist_id}"
+    # Canciones de una playlist, todas las páginas.
+    # ?format=json|ndjson  ?fields=id,title,artist.name,duration
+    output_format = request.args.get('format', 'json')
+    if output_format not in FORMATS:
+        return jsonify({"error": f"'format' debe ser uno de: {', '.join(FORMATS)}"}), 400
+    fields = parse_fields(request.args.get('fields', ''))
 
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Lanza error si hay status code != 200
-        tracks = response.json()
-        return jsonify(tracks)
-
-    except requests.exceptions.RequestException as e:
-        return jsonify({
-            "error": "Error al conectar con la API de Deezer",
-            "detalle": str(e),
-            "url_usada": response.request.url if response else url
-        }), 500
\ No newline at end of file
+    playlist = get_json(f"playlist/{playlist_id}", ttl=TTL["playlist"])
+    pages, complete = track_pages(playlist_id, playlist)
+
+    if output_format == "ndjson":
+        body, mimetype = stream_ndjson(playlist_id, playlist, pages, fields), "application/x-ndjson"
+    else:
+        body, mimetype = stream_json(playlist_id, playlist, pages, fields), "application/json"
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    # Que el proxy no acumule la respuesta: las primeras pistas salen ya
+    response.headers["X-Accel-Buffering"] = "no"
+    if not complete:
+        # Un fallo a mitad dejaría un documento truncado: ni ETag ni caché
+        response.cache_control.no_store = True
+        return response
+    # Deezer cambia el checksum de la playlist cuando se modifica
+    checksum = playlist.get("checksum")
+    if checksum:
+        variant = f"{checksum}:{output_format}:{request.args.get('fields', '')}"
+        response.set_etag(hashlib.sha1(variant.encode("utf-8")).hexdigest())
+        response.cache_control.public = True
+        response.cache_control.max_age = TTL["playlist"]
+        return response.make_conditional(request)
+    return response
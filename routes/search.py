@@ -1,41 +1,72 @@
 # api/routes/search.py
 from flask import Blueprint, request, jsonify
-import requests
+from services.cache import TTL
+from services.deezer_client import get_json, handle_deezer_errors
+from services.responses import cached_json
+from services.search_index import SUGGEST_TYPES, get_index, normalize_query
 
 search_bp = Blueprint('search', __name__)
 
+# Sugerencias: resultados mínimos en el índice local para no consultar Deezer
+SUGGEST_MIN_RESULTS = 5
+# Prefijos más cortos que esto nunca se consultan a Deezer
+SUGGEST_MIN_CHARS = 2
+SUGGEST_MAX_LIMIT = 25
+
+
+def search_upstream(path, query, limit):
+    # Consulta cacheada por (consulta normalizada, tipo); los resultados
+    # alimentan el índice de sugerencias
+    resultados = get_json(path, params={'q': normalize_query(query), 'limit': limit}, ttl=TTL["search"])
+    get_index().add(resultados.get("data", []))
+    return resultados
+
+
 @search_bp.route('/', methods=['GET'])
+@handle_deezer_errors("Error al conectar con la API de Deezer")
 def buscar_en_deezer():
     # Obtener el término de búsqueda desde los parámetros de la URL
     query = request.args.get('q')
     search_type = request.args.get('type', default='all')  # 'artist', 'track', 'album' o 'all'
 
-    if not query:
+    if not query or not normalize_query(query):
         return jsonify({"error": "Falta el término de búsqueda 'q'"}), 400
 
-    # URL base de la API de Deezer
-    base_url = "https://api.deezer.com/search" 
-
     # Mapeo de tipos de búsqueda
     valid_types = ['artist', 'track', 'album']
     if search_type in valid_types:
-        url = f"{base_url}/{search_type}"
+        path = f"search/{search_type}"
     else:
-        url = base_url  # Búsqueda general (all)
+        path = "search"  # Búsqueda general (all)
 
-    # Realizar la solicitud a la API de Deezer con límite de 30 resultados
-    try:
-        params = {
-            'q': query,
-            'limit': 70  # Aquí se establece el límite a 30 resultados
-        }
+    # Realizar la solicitud a la API de Deezer con límite de 70 resultados
+    resultados = search_upstream(path, query, 70)
 
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        resultados = response.json()
+    return cached_json(resultados, TTL["search"])
+
+
+@search_bp.route('/suggest', methods=['GET'])
+@handle_deezer_errors("Error al conectar con la API de Deezer")
+def sugerir_busqueda():
+    # Autocompletado: ?q=prefijo&limit=10&type=artist,track
+    prefix = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', default=10, type=int), SUGGEST_MAX_LIMIT))
+    types = request.args.get('type')
+    types = {t.strip() for t in types.split(",")} if types else None
+    if types and not types <= set(SUGGEST_TYPES):
+        return jsonify({"error": f"'type' debe contener: {', '.join(SUGGEST_TYPES)}"}), 400
+
+    query = normalize_query(prefix)
+    if not query:
+        return jsonify({"error": "Falta el término de búsqueda 'q'"}), 400
 
-        return jsonify(resultados)
-        
+    # Primero el índice local; Deezer solo si no hay bastantes resultados
+    index = get_index()
+    sugerencias = index.suggest(query, limit, types)
+    source = "index"
+    if len(sugerencias) < min(limit, SUGGEST_MIN_RESULTS) and len(query) >= SUGGEST_MIN_CHARS:
+        search_upstream("search", query, 25)
+        sugerencias = index.suggest(query, limit, types)
+        source = "upstream"
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": "Error al conectar con la API de Deezer", "detalle": str(e)}), 500
\ No newline at end of file
+    return cached_json({"data": sugerencias, "total": len(sugerencias), "source": source}, 60)
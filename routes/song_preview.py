@@ -1,35 +1,86 @@
-from flask import Blueprint, jsonify, request
-import requests
+import io
+import os
+from flask import Blueprint, jsonify, request, send_file, url_for
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from services import previews, storage
+from services.batch import BATCH_MAX_IDS, fetch_batch, parse_ids
+from services.cache import TTL
+from services.deezer_client import handle_deezer_errors
+from services.responses import cached_json
 
 song_preview_bp = Blueprint('preview', __name__)
 
+# Un clip nunca cambia para el mismo ID
+PREVIEW_MAX_AGE = int(os.environ.get("PREVIEW_MAX_AGE", 24 * 3600))
+
+
+def _preview_data(track):
+    previews.remember([track])
+    return {
+        "songId": track.get("id"),
+        "preview": track.get("preview") or None,
+        "duration": 30
+    }
+
+
+@song_preview_bp.route('/batch', methods=['GET'])
+def obtener_previews_por_lote():
+    ids = parse_ids(request.args.get('ids'))
+    if ids is None:
+        return jsonify({"error": f"Se requiere 'ids' con hasta {BATCH_MAX_IDS} IDs numéricos separados por comas"}), 400
+
+    # Solo se consulta Deezer para las URLs que no están guardadas
+    cached = {song_id: previews.cached_url(song_id) for song_id in ids}
+    missing = [song_id for song_id in ids if cached[song_id] is None]
+    fetched = {item["id"]: item for item in fetch_batch("track", missing, TTL["track"], transform=_preview_data)}
+
+    resultados = []
+    for song_id in ids:
+        entry = cached[song_id]
+        if entry is None:
+            resultados.append(fetched[int(song_id)])
+        else:
+            resultados.append({"id": int(song_id), "data": {"songId": int(song_id), "preview": entry["url"], "duration": 30}})
+    return jsonify({"data": resultados, "total": len(resultados)})
+
 
 @song_preview_bp.route('/<int:song_id>', methods=['GET'])
+@handle_deezer_errors("Error al obtener el preview", not_found_msg="Canción no encontrada")
 def obtener_preview(song_id):
-    try:
-        # URL para obtener info de la canción por ID (incluye preview)
-        url = f"https://api.deezer.com/track/{song_id}" 
+    # URL del preview (guardada hasta que caduca su firma)
+    entry = previews.preview_url(song_id)
 
-        response = requests.get(url)
-        response.raise_for_status()  # Lanza error si hay código HTTP != 2xx
-        data = response.json()
+    if not entry["url"]:
+        return jsonify({"error": "No se encontró un preview para esta canción"}), 404
 
-        preview_url = data.get("preview", "")
+    return cached_json({
+        "songId": song_id,
+        "preview": entry["url"],
+        "audio": url_for('.obtener_audio_preview', song_id=song_id),
+        "duration": 30  # Los previews de Deezer duran ~30 segundos
+    }, min(TTL["track"], previews.url_ttl(entry["expires"])))
 
-        if not preview_url or preview_url == "":
-            return jsonify({"error": "No se encontró un preview para esta canción"}), 404
 
-        return jsonify({
-            "songId": song_id,
-            "preview": preview_url,
-            "duration": 30  # Los previews de Deezer duran ~30 segundos
-        })
+@song_preview_bp.route('/<int:song_id>/audio', methods=['GET'])
+@handle_deezer_errors("Error al obtener el preview", not_found_msg="Canción no encontrada")
+def obtener_audio_preview(song_id):
+    # El clip servido desde memoria o disco, con soporte de Range
+    data, path = previews.get_clip(song_id)
+    if data is None and path is None:
+        return jsonify({"error": "No se encontró un preview para esta canción"}), 404
 
-    except requests.exceptions.HTTPError as err:
-        if response.status_code == 404:
-            return jsonify({"error": "Canción no encontrada", "detalle": str(err)}), 404
-        else:
-            return jsonify({"error": "Error al obtener el preview", "detalle": str(err)}), 500
+    if data is not None:
+        body, size = io.BytesIO(data), len(data)
+    else:
+        storage.touch(path)
+        body, size = path, os.path.getsize(path)
 
-    except Exception as e:
-        return jsonify({"error": "Ocurrió un problema interno", "detalle": str(e)}), 500
\ No newline at end of file
+    # Mismo ETag desde memoria y desde disco, para que If-Range funcione
+    try:
+        return send_file(
+            body, mimetype="audio/mpeg", conditional=True,
+            etag=f"preview-{song_id}-{size:x}", max_age=PREVIEW_MAX_AGE
+        )
+    except RequestedRangeNotSatisfiable as e:
+        # 416 con Content-Range, no el 500 genérico de handle_deezer_errors
+        return e.get_response()
@@ -0,0 +1,16 @@
+# routes/track.py
+from flask import Blueprint, jsonify, request
+from services.batch import BATCH_MAX_IDS, fetch_batch, parse_ids
+from services.cache import TTL
+
+track_bp = Blueprint('track', __name__)
+
+@track_bp.route('/batch', methods=['GET'])
+def obtener_canciones_por_lote():
+    # /track/batch?ids=1,2,3 -> resultados en el mismo orden, con error por elemento
+    ids = parse_ids(request.args.get('ids'))
+    if ids is None:
+        return jsonify({"error": f"Se requiere 'ids' con hasta {BATCH_MAX_IDS} IDs numéricos separados por comas"}), 400
+
+    resultados = fetch_batch("track", ids, TTL["track"])
+    return jsonify({"data": resultados, "total": len(resultados)})
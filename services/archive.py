@@ -0,0 +1,51 @@
+# services/archive.py
+# Escritor de ZIP en streaming: cada archivo se copia por bloques al ZIP en
+# disco a medida que está listo, sin mantener el archivo entero en memoria.
+# Los MP3 ya están comprimidos, así que se guardan sin DEFLATE.
+import os
+import zipfile
+import logging
+import threading
+
+from services import offload
+
+logger = logging.getLogger(__name__)
+
+STORED_EXTENSIONS = (".mp3", ".jpg", ".jpeg", ".png", ".zip")
+
+
+class StreamingZip:
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self.file_count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(zip_path) or ".", exist_ok=True)
+        self._zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def add(self, file_path, arcname):
+        if file_path.lower().endswith(STORED_EXTENSIONS):
+            compress_type = zipfile.ZIP_STORED
+        else:
+            compress_type = zipfile.ZIP_DEFLATED
+        # ZipFile no admite escrituras concurrentes
+        with self._lock:
+            offload.run_blocking(self._zipf.write, file_path, arcname, compress_type=compress_type)
+            self.file_count += 1
+        logger.debug(f"Añadido al ZIP: {file_path} como {arcname}")
+
+    def add_bytes(self, data, arcname):
+        with self._lock:
+            self._zipf.writestr(arcname, data, compress_type=zipfile.ZIP_DEFLATED)
+            self.file_count += 1
+
+    def close(self):
+        with self._lock:
+            self._zipf.close()
+        return self.zip_path
+
+    def abort(self):
+        try:
+            self.close()
+        finally:
+            if os.path.exists(self.zip_path):
+                os.remove(self.zip_path)
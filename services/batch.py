@@ -0,0 +1,39 @@
+# services/batch.py
+# Endpoints por lotes: N recursos de Deezer en una sola petición del cliente,
+# consultados en paralelo con un pool acotado y devueltos en el orden pedido.
+import os
+
+from services.deezer_client import DeezerAPIError, DeezerNotFound, fanout_pool, get_json
+
+BATCH_MAX_IDS = int(os.environ.get("BATCH_MAX_IDS", 50))
+
+
+def parse_ids(raw):
+    # "1,2,3" -> ["1", "2", "3"]; None si el parámetro no es válido
+    if not raw:
+        return None
+    ids = [part.strip() for part in raw.split(",") if part.strip()]
+    if not ids or len(ids) > BATCH_MAX_IDS or not all(i.isdigit() for i in ids):
+        return None
+    return ids
+
+
+def _fetch_item(path, item_id, ttl, transform):
+    try:
+        data = get_json(path, ttl=ttl)
+        return {"id": int(item_id), "data": transform(data) if transform else data}
+    except DeezerNotFound:
+        return {"id": int(item_id), "error": "No encontrado", "status": 404}
+    except DeezerAPIError as e:
+        return {"id": int(item_id), "error": str(e), "status": 502}
+    except Exception as e:
+        return {"id": int(item_id), "error": str(e), "status": 500}
+
+
+def fetch_batch(resource, ids, ttl, transform=None):
+    # Cada elemento lleva su propio error para no fallar el lote entero
+    futures = [
+        fanout_pool.submit(_fetch_item, f"{resource}/{item_id}", item_id, ttl, transform)
+        for item_id in ids
+    ]
+    return [future.result() for future in futures]
@@ -0,0 +1,200 @@
+# services/cache.py
+# Caché de respuestas de Deezer con TTL por ruta y expulsión LRU bajo un
+# límite de memoria. El backend "sqlite" guarda las entradas en disco para
+# que todos los workers de gunicorn las compartan. Con set(..., stale=N) la
+# entrada se conserva N segundos más allá de su TTL: get() ya no la
+# devuelve, pero get_entry() sí, junto con el fin de su frescura, para
+# servirla mientras se refresca en segundo plano (stale-while-revalidate).
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from services.config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")  # 'memory' o 'sqlite'
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_DB = os.environ.get("CACHE_DB", os.path.join(DATA_DIR, "cache.sqlite3"))
+
+
+def _ttl(name, default):
+    return int(os.environ.get(f"CACHE_TTL_{name.upper()}", default))
+
+
+# TTL (segundos) por tipo de recurso
+TTL = {
+    "album": _ttl("album", 24 * 3600),
+    "artist": _ttl("artist", 6 * 3600),
+    "artist_top": _ttl("artist_top", 3600),
+    "discography": _ttl("discography", 3600),
+    "chart": _ttl("chart", 300),
+    "playlist": _ttl("playlist", 600),
+    "track": _ttl("track", 600),  # Las URLs de preview están firmadas y caducan
+    "search": _ttl("search", 900),
+}
+
+# Tiempo extra que se conserva una respuesta de Deezer pasada de TTL, para
+# servirla mientras se refresca (solo en las llamadas que lo piden)
+STALE_WINDOW = int(os.environ.get("CACHE_STALE_SECONDS", 3600))
+
+
+class MemoryCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()  # key -> (value, expires_at, fresh_until)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Solo entradas frescas
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None and entry[1] > time.time() else None
+
+    def get_entry(self, key):
+        # (valor, fresca_hasta) o None; puede estar ya pasada de TTL
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[0], entry[2]
+
+    def set(self, key, value, ttl, stale=0):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, now + ttl + stale, now + ttl)
+            self.size += len(value)
+            # Expulsar los menos usados recientemente
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def _remove(self, key):
+        value = self._data.pop(key)[0]
+        self.size -= len(value)
+
+
+class SQLiteCache:
+    # Solo se actualiza el acceso de una entrada si es más antiguo que esto,
+    # para no convertir cada lectura en una escritura.
+    TOUCH_INTERVAL = 60
+    # El tamaño total se mide con SUM(size) cada tantas escrituras o cuando
+    # la estimación local (última medida + lo escrito desde entonces) pasa
+    # del límite; las escrituras de otros workers se ven en la siguiente medida
+    EVICT_CHECK_INTERVAL = 100
+
+    def __init__(self, path=CACHE_DB, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._size_lock = threading.Lock()
+        self._estimated = None  # bytes; None hasta la primera medida
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " expires REAL NOT NULL, fresh REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        # Solo entradas frescas
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None and entry[1] > time.time() else None
+
+    def get_entry(self, key):
+        # (valor, fresca_hasta) o None; puede estar ya pasada de TTL
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires, fresh, accessed FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, fresh, accessed = row
+        if expires <= now:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now))
+            return None
+        if accessed < now - self.TOUCH_INTERVAL:
+            conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return value, fresh
+
+    def set(self, key, value, ttl, stale=0):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, size, expires, fresh, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, value, len(value), now + ttl + stale, now + ttl, now)
+        )
+        with self._size_lock:
+            self._writes += 1
+            if self._estimated is not None:
+                self._estimated += len(value)
+            check = (self._estimated is None or self._estimated > self.max_bytes
+                     or self._writes >= self.EVICT_CHECK_INTERVAL)
+            if check:
+                self._writes = 0
+        if check:
+            self._evict(conn, now)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _evict(self, conn, now):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total > self.max_bytes:
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+            # Borrar por lotes las entradas menos usadas hasta volver al límite
+            while total > self.max_bytes:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT 50)"
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        with self._size_lock:
+            self._estimated = total
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if CACHE_BACKEND == "sqlite":
+                    _cache = SQLiteCache()
+                else:
+                    _cache = MemoryCache()
+                logger.info(f"Caché de metadatos: {type(_cache).__name__}")
+    return _cache
@@ -0,0 +1,105 @@
+# services/checkpoint.py
+# Manifiesto de progreso de un trabajo de descarga, guardado junto a su
+# carpeta (<carpeta>.checkpoint.json). Registra cada pista terminada con su
+# archivo y checksum, y el ZIP ya construido, para que un reintento continúe
+# desde el primer paso incompleto en lugar de empezar de cero.
+import os
+import json
+import time
+import hashlib
+import threading
+
+from services import offload
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_checksum(path):
+    def _sha1():
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return offload.run_blocking(_sha1)
+
+
+def _file_entry(path):
+    return {"file": os.path.basename(path), "size": os.path.getsize(path), "sha1": file_checksum(path)}
+
+
+def _matches(entry, path):
+    # El archivo sigue siendo el que se registró
+    if not entry or entry.get("file") != os.path.basename(path):
+        return False
+    try:
+        if os.path.getsize(path) != entry["size"]:
+            return False
+    except OSError:
+        return False
+    return file_checksum(path) == entry["sha1"]
+
+
+class Checkpoint:
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = None
+        # El manifiesto de otro trabajo con la misma carpeta no sirve
+        if not data or data.get("key") != self.key:
+            data = {"key": self.key, "tracks": {}, "archive": None}
+        return data
+
+    @property
+    def resumed(self):
+        return bool(self.data["tracks"] or self.data["archive"])
+
+    def _save(self):
+        self.data["updated_at"] = time.time()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def completed_track(self, track_id, file_path):
+        entry = self.data["tracks"].get(str(track_id))
+        return bool(entry) and entry.get("state") == "done" and _matches(entry, file_path)
+
+    def track_done(self, track_id, file_path):
+        entry = dict(_file_entry(file_path), state="done")
+        with self._lock:
+            self.data["tracks"][str(track_id)] = entry
+            # Un ZIP anterior ya no refleja las pistas
+            self.data["archive"] = None
+            self._save()
+
+    def track_failed(self, track_id, error):
+        with self._lock:
+            self.data["tracks"][str(track_id)] = {"state": "failed", "error": error}
+            self._save()
+
+    def completed_archive(self, zip_path, track_ids):
+        # El ZIP del intento anterior sirve si está intacto y contiene
+        # exactamente las pistas del álbum; si faltaba alguna, se reintenta
+        entry = self.data["archive"]
+        return bool(entry) and set(entry["tracks"]) == {str(i) for i in track_ids} and _matches(entry, zip_path)
+
+    def archive_done(self, zip_path, track_ids):
+        entry = dict(_file_entry(zip_path), tracks=[str(i) for i in track_ids])
+        with self._lock:
+            self.data["archive"] = entry
+            self._save()
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,8 @@
+# services/config.py
+import os
+
+# Directorio de descargas servido en /downloads
+DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "./downloads")
+
+# Datos internos del servicio (cachés, índices, colas)
+DATA_DIR = os.environ.get("DATA_DIR", "./data")
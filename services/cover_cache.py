@@ -0,0 +1,82 @@
+# services/cover_cache.py
+# Caché de portadas para el etiquetado ID3: LRU en memoria delante de una
+# copia en disco, cuyo tamaño mantiene el barrido de services/storage. Las
+# descargas simultáneas de la misma portada se agrupan en una sola petición.
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from services.config import DATA_DIR
+from services.deezer_client import get_bytes
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+COVER_CACHE_DIR = os.environ.get("COVER_CACHE_DIR", os.path.join(DATA_DIR, "covers"))
+COVER_CACHE_MAX_BYTES = int(os.environ.get("COVER_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+_memory = OrderedDict()  # url -> bytes
+_memory_size = 0
+_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def _disk_path(url):
+    return os.path.join(COVER_CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".jpg")
+
+
+def _remember(url, data):
+    global _memory_size
+    if len(data) > COVER_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        if url in _memory:
+            return
+        _memory[url] = data
+        _memory_size += len(data)
+        while _memory_size > COVER_CACHE_MAX_BYTES:
+            _, old = _memory.popitem(last=False)
+            _memory_size -= len(old)
+
+
+def _load(url):
+    # Disco primero; si no está, se descarga y se guarda de forma atómica
+    path = _disk_path(url)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # Último uso para la expulsión LRU del barrido (noatime no lo marca)
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+        return data
+    except FileNotFoundError:
+        pass
+
+    data = get_bytes(url)
+    os.makedirs(COVER_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    logger.info(f"Portada descargada: {url}")
+    return data
+
+
+def _load_and_remember(url):
+    data = _load(url)
+    _remember(url, data)
+    return data
+
+
+def get_cover(url):
+    with _lock:
+        data = _memory.get(url)
+        if data is not None:
+            _memory.move_to_end(url)
+            return data
+
+    # Si otra petición ya está descargando esta portada, se espera a esa
+    return _flights.do(url, _load_and_remember, url)
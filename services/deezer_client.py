@@ -0,0 +1,312 @@
+# services/deezer_client.py
+# Cliente compartido para la API de Deezer: una sola sesión con pool de
+# conexiones keep-alive, timeouts por llamada, reintentos acotados con jitter
+# y una única capa de mapeo de errores para todos los blueprints.
+import os
+import json
+import random
+import time
+import logging
+import threading
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import g, has_request_context, jsonify
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
+
+from services import metrics
+from services.cache import STALE_WINDOW, get_cache
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEEZER_API = os.environ.get("DEEZER_API_URL", "https://api.deezer.com")
+
+# El pool se dimensiona según los hilos que atiende cada worker
+DEEZER_POOL_SIZE = int(os.environ.get("DEEZER_POOL_SIZE", os.environ.get("THREADS", 16)))
+DEEZER_CONNECT_TIMEOUT = float(os.environ.get("DEEZER_CONNECT_TIMEOUT", 3.05))
+DEEZER_READ_TIMEOUT = float(os.environ.get("DEEZER_READ_TIMEOUT", 10))
+DEEZER_MAX_RETRIES = int(os.environ.get("DEEZER_MAX_RETRIES", 3))
+DEEZER_BACKOFF = float(os.environ.get("DEEZER_BACKOFF", 0.25))
+# Peticiones paralelas para lotes y paginación
+DEEZER_FANOUT_WORKERS = int(os.environ.get("DEEZER_FANOUT_WORKERS", os.environ.get("BATCH_WORKERS", 8)))
+DEEZER_PAGE_SIZE = 100
+DEEZER_MAX_PAGES = int(os.environ.get("DEEZER_MAX_PAGES", 50))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Códigos de error que Deezer devuelve con status 200 dentro del JSON
+DEEZER_QUOTA_ERROR = 4
+DEEZER_NOT_FOUND_ERROR = 800
+
+
+class DeezerAPIError(Exception):
+    def __init__(self, message, status_code=500, url=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.url = url
+
+
+class DeezerNotFound(DeezerAPIError):
+    def __init__(self, message, url=None):
+        super().__init__(message, status_code=404, url=url)
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DEEZER_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = _build_session()
+
+# Peticiones idénticas simultáneas comparten una sola llamada a Deezer
+_flights = SingleFlight()
+
+# Pool compartido para peticiones en paralelo. Solo recibe llamadas "hoja"
+# (get_json), nunca tareas que esperen a otras, para no bloquearse.
+fanout_pool = ThreadPoolExecutor(max_workers=DEEZER_FANOUT_WORKERS, thread_name_prefix="deezer")
+
+# Claves con un refresco stale-while-revalidate en curso
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _api_url(path):
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return f"{DEEZER_API}/{path.lstrip('/')}"
+
+
+def _sleep_backoff(attempt, retry_after=None):
+    if retry_after:
+        try:
+            time.sleep(min(float(retry_after), 5.0))
+            return
+        except ValueError:
+            pass
+    # Backoff exponencial con "full jitter"
+    time.sleep(random.uniform(0, DEEZER_BACKOFF * (2 ** attempt)))
+
+
+def request(url, params=None, timeout=None):
+    # GET con reintentos ante 429/5xx y errores de conexión
+    timeout = timeout or (DEEZER_CONNECT_TIMEOUT, DEEZER_READ_TIMEOUT)
+    attempt = 0
+    while True:
+        try:
+            with metrics.UPSTREAM_LATENCY.time():
+                response = session.get(url, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.UPSTREAM_RESPONSES.inc(status="error")
+            if attempt >= DEEZER_MAX_RETRIES:
+                raise DeezerAPIError(f"Error al conectar con Deezer: {e}", 504, url)
+            logger.warning(f"Reintentando {url} tras error de conexión: {e}")
+            metrics.UPSTREAM_RETRIES.inc(reason="connection")
+            _sleep_backoff(attempt)
+            attempt += 1
+            continue
+
+        metrics.UPSTREAM_RESPONSES.inc(status=str(response.status_code))
+        if response.status_code in RETRY_STATUS and attempt < DEEZER_MAX_RETRIES:
+            logger.warning(f"Reintentando {url} (status {response.status_code})")
+            metrics.UPSTREAM_RETRIES.inc(reason=str(response.status_code))
+            _sleep_backoff(attempt, response.headers.get("Retry-After"))
+            attempt += 1
+            continue
+
+        return response
+
+
+def _cache_key(url, params):
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+
+def get_json(path, params=None, timeout=None, ttl=None, stale=False):
+    # Con ttl, la respuesta se sirve desde (y se guarda en) la caché compartida.
+    # Las entradas se conservan STALE_WINDOW segundos más allá del ttl; con
+    # stale=True una copia en ese margen se devuelve al momento y se refresca
+    # en segundo plano. Sin stale cuenta como fallo aunque siga guardada.
+    url = _api_url(path)
+    key = _cache_key(url, params)
+    if ttl:
+        entry = get_cache().get_entry(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > time.time():
+                metrics.CACHE_LOOKUPS.inc(result="hit")
+                return json.loads(value)
+            if stale:
+                metrics.CACHE_LOOKUPS.inc(result="stale")
+                _revalidate(key, url, params, timeout, ttl)
+                # cached_json no debe anunciar esta copia como fresca
+                if has_request_context():
+                    g.cache_stale = True
+                return json.loads(value)
+        metrics.CACHE_LOOKUPS.inc(result="miss")
+        return _flights.do(key, _fetch_and_cache, key, url, params, timeout, ttl)
+    return _flights.do(key, _fetch_json, url, params, timeout)
+
+
+def refresh_json(path, params=None, timeout=None, ttl=None):
+    # Pide el recurso a Deezer aunque esté en caché y guarda la respuesta
+    url = _api_url(path)
+    key = _cache_key(url, params)
+    return _flights.do(key, _fetch_and_cache, key, url, params, timeout, ttl)
+
+
+def needs_refresh(path, params=None):
+    # True si el recurso no está en caché o solo queda la copia pasada de TTL
+    entry = get_cache().get_entry(_cache_key(_api_url(path), params))
+    return entry is None or entry[1] <= time.time()
+
+
+def _fetch_and_cache(key, url, params, timeout, ttl):
+    data = _fetch_json(url, params, timeout)
+    get_cache().set(key, json.dumps(data).encode("utf-8"), ttl, STALE_WINDOW)
+    return data
+
+
+def _revalidate(key, url, params, timeout, ttl):
+    # Un solo refresco en segundo plano por clave; si falla se sigue
+    # sirviendo la copia anterior hasta que caduque del todo
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            _flights.do(key, _fetch_and_cache, key, url, params, timeout, ttl)
+        except Exception as e:
+            logger.warning(f"No se pudo refrescar {key}: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    fanout_pool.submit(run)
+
+
+def _fetch_json(url, params=None, timeout=None):
+    attempt = 0
+    while True:
+        response = request(url, params=params, timeout=timeout)
+
+        if response.status_code == 404:
+            raise DeezerNotFound("Recurso no encontrado en Deezer", url)
+        if response.status_code >= 400:
+            raise DeezerAPIError(
+                f"{response.status_code} Error de Deezer para la url: {response.url}",
+                response.status_code, url
+            )
+
+        data = response.json()
+
+        # Deezer informa de muchos errores con status 200
+        error = data.get("error") if isinstance(data, dict) else None
+        if error:
+            code = error.get("code") if isinstance(error, dict) else None
+            message = error.get("message", "Error de Deezer") if isinstance(error, dict) else str(error)
+            if code == DEEZER_QUOTA_ERROR and attempt < DEEZER_MAX_RETRIES:
+                metrics.UPSTREAM_RETRIES.inc(reason="quota")
+                _sleep_backoff(attempt)
+                attempt += 1
+                continue
+            if code == DEEZER_NOT_FOUND_ERROR:
+                raise DeezerNotFound(message, url)
+            raise DeezerAPIError(message, 429 if code == DEEZER_QUOTA_ERROR else 500, url)
+
+        return data
+
+
+def get_all_pages(paths, ttl=None, page_size=DEEZER_PAGE_SIZE):
+    # Recorre todas las páginas de uno o varios listados paginados de Deezer.
+    # Primero se piden en paralelo las primeras páginas (que traen "total") y
+    # después el resto de páginas de todos los listados a la vez.
+    # Devuelve una lista de elementos por cada path, en orden.
+    first_futures = [
+        fanout_pool.submit(get_json, path, {"index": 0, "limit": page_size}, None, ttl)
+        for path in paths
+    ]
+    first_pages = [future.result() for future in first_futures]
+
+    results = []
+    pending = []
+    for i, (path, page) in enumerate(zip(paths, first_pages)):
+        results.append(list(page.get("data", [])))
+        total = page.get("total")
+        if total is None:
+            # Sin total: se siguen los enlaces "next" uno a uno
+            results[i].extend(_follow_next(page, ttl))
+            continue
+        last_index = min(total, page_size * DEEZER_MAX_PAGES)
+        for index in range(page_size, last_index, page_size):
+            future = fanout_pool.submit(get_json, path, {"index": index, "limit": page_size}, None, ttl)
+            pending.append((i, future))
+
+    for i, future in pending:
+        results[i].extend(future.result().get("data", []))
+    return results
+
+
+def iter_pages(path, start, total, ttl=None, page_size=DEEZER_PAGE_SIZE):
+    # Pide en paralelo las páginas de un listado desde start hasta total y
+    # las entrega en orden según llegan, para poder responder en streaming.
+    # Si se deja de consumir (cliente desconectado) se cancela lo pendiente.
+    last_index = min(total, start + page_size * DEEZER_MAX_PAGES)
+    futures = [
+        fanout_pool.submit(get_json, path, {"index": index, "limit": page_size}, None, ttl)
+        for index in range(start, last_index, page_size)
+    ]
+    try:
+        for future in futures:
+            yield future.result().get("data", [])
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _follow_next(page, ttl):
+    items = []
+    pages = 1
+    while page.get("next") and pages < DEEZER_MAX_PAGES:
+        page = get_json(page["next"], ttl=ttl)
+        items.extend(page.get("data", []))
+        pages += 1
+    return items
+
+
+def get_bytes(url, timeout=None):
+    # Descarga binaria (portadas, previews) reutilizando el mismo pool
+    response = request(url, timeout=timeout)
+    if response.status_code == 404:
+        raise DeezerNotFound("Recurso no encontrado", url)
+    if response.status_code >= 400:
+        raise DeezerAPIError(f"{response.status_code} al descargar {url}", response.status_code, url)
+    return response.content
+
+
+def handle_deezer_errors(error_msg, not_found_msg=None):
+    # Sustituye los try/except copiados en cada blueprint
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            except DeezerNotFound as err:
+                if not_found_msg:
+                    return jsonify({"error": not_found_msg}), 404
+                return jsonify({"error": error_msg, "detalle": str(err)}), 500
+            except DeezerAPIError as err:
+                return jsonify({"error": error_msg, "detalle": str(err)}), 500
+            except Exception as e:
+                logger.error(f"Error en {view.__name__}: {e}", exc_info=True)
+                return jsonify({"error": "Ocurrió un problema interno", "detalle": str(e)}), 500
+        return wrapper
+    return decorator
@@ -0,0 +1,176 @@
+# services/deezer_session.py
+# Sesiones de deezspot (DeeLogin) compartidas por todo el proceso. Se crean
+# la primera vez que se necesitan, no al importar, así que un login lento o
+# caído no retrasa el arranque ni afecta a las rutas de metadatos (que no
+# llegan a importar deezspot). Hasta DEEZER_SESSION_POOL_SIZE descargas usan
+# cada una su propia sesión; una sesión caducada se descarta y se vuelve a
+# hacer login de forma transparente.
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Igual que MAX_CONCURRENT_DOWNLOADS por defecto: una sesión por descarga
+DEEZER_SESSION_POOL_SIZE = int(os.environ.get("DEEZER_SESSION_POOL_SIZE", 8))
+# Las sesiones más antiguas que esto se renuevan antes de usarlas
+DEEZER_SESSION_MAX_AGE = int(os.environ.get("DEEZER_SESSION_MAX_AGE", 6 * 3600))
+# Fallos seguidos tras los que una sesión se considera rota
+DEEZER_SESSION_MAX_FAILURES = int(os.environ.get("DEEZER_SESSION_MAX_FAILURES", 3))
+DEEZER_LOGIN_TIMEOUT = float(os.environ.get("DEEZER_LOGIN_TIMEOUT", 60))
+# Hacer login en segundo plano al arrancar en vez de en la primera descarga
+DEEZER_SESSION_PREWARM = os.environ.get("DEEZER_SESSION_PREWARM", "0") == "1"
+
+# Nombres de las excepciones de deezspot que indican un ARL inválido o caducado
+AUTH_ERROR_MARKERS = ("credential", "login", "auth", "token", "arl")
+
+
+class DeezerSessionError(Exception):
+    pass
+
+
+def _default_factory():
+    # Importación diferida: solo las descargas necesitan deezspot
+    from deezspot.deezloader import DeeLogin
+    from arl import arl_token
+
+    return DeeLogin(arl=arl_token)
+
+
+class _Entry:
+    def __init__(self, session):
+        self.session = session
+        self.created = time.monotonic()
+        self.failures = 0
+
+    def healthy(self):
+        return (
+            time.monotonic() - self.created < DEEZER_SESSION_MAX_AGE
+            and self.failures < DEEZER_SESSION_MAX_FAILURES
+        )
+
+
+def is_auth_error(error):
+    name = type(error).__name__.lower()
+    return any(marker in name for marker in AUTH_ERROR_MARKERS)
+
+
+class SessionPool:
+    def __init__(self, factory=_default_factory, size=DEEZER_SESSION_POOL_SIZE):
+        self.factory = factory
+        self.size = size
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def _login(self):
+        start = time.monotonic()
+        try:
+            session = self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+        logger.info(f"Sesión de Deezer iniciada en {time.monotonic() - start:.1f}s")
+        return _Entry(session)
+
+    def acquire(self):
+        deadline = time.monotonic() + DEEZER_LOGIN_TIMEOUT
+        with self._cond:
+            while True:
+                while self._idle:
+                    entry = self._idle.pop()
+                    if entry.healthy():
+                        return entry
+                    # Caducada o con demasiados fallos: se descarta
+                    self._created -= 1
+                    logger.info("Descartando sesión de Deezer caducada")
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeezerSessionError("No hay sesiones de Deezer disponibles")
+                self._cond.wait(remaining)
+        # El login se hace fuera del lock para no bloquear a los demás
+        return self._login()
+
+    def release(self, entry, discard=False):
+        with self._cond:
+            if discard or not entry.healthy():
+                self._created -= 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self):
+        entry = self.acquire()
+        discard = False
+        try:
+            yield entry.session
+            entry.failures = 0
+        except Exception as e:
+            entry.failures += 1
+            discard = is_auth_error(e)
+            raise
+        finally:
+            self.release(entry, discard)
+
+    def run(self, fn):
+        # fn(sesión); si falla por autenticación se repite una vez con una
+        # sesión nueva
+        try:
+            with self.session() as session:
+                return fn(session)
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            logger.warning(f"Sesión de Deezer rechazada ({type(e).__name__}), repitiendo con un login nuevo")
+        with self.session() as session:
+            return fn(session)
+
+    def reset(self):
+        with self._cond:
+            self._created -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.size, "created": self._created, "idle": len(self._idle)}
+
+
+_pool = SessionPool()
+
+
+def get_pool():
+    return _pool
+
+
+def set_session_factory(factory):
+    # Permite sustituir DeeLogin (p. ej. por uno falso en el benchmark)
+    _pool.factory = factory
+    _pool.reset()
+
+
+def run(fn):
+    return _pool.run(fn)
+
+
+def prewarm():
+    # Login de una sesión en segundo plano, sin retrasar el arranque
+    if not DEEZER_SESSION_PREWARM:
+        return
+
+    def warm():
+        try:
+            with _pool.session():
+                pass
+        except Exception as e:
+            logger.error(f"No se pudo iniciar sesión en Deezer: {e}")
+
+    threading.Thread(target=warm, name="deezer-login", daemon=True).start()
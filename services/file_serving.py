@@ -0,0 +1,116 @@
+# services/file_serving.py
+# Servido de archivos grandes (MP3, ZIP) con soporte de Range/206 y
+# validadores fuertes. Bajo gunicorn el archivo se entrega con
+# wsgi.file_wrapper, que usa os.sendfile incluso para rangos parciales.
+# Opcionalmente la transferencia se delega al proxy (X-Accel-Redirect de
+# nginx o X-Sendfile de Apache/lighttpd) para no ocupar un worker de Python.
+import os
+import mimetypes
+from urllib.parse import quote
+
+from flask import Response, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.wsgi import wrap_file
+
+SENDFILE_MODE = os.environ.get("SENDFILE_MODE", "")  # '', 'x-accel' o 'x-sendfile'
+# Ubicación interna de nginx que apunta al directorio de descargas
+X_ACCEL_PREFIX = os.environ.get("X_ACCEL_PREFIX", "/protected-downloads/")
+DOWNLOAD_MAX_AGE = int(os.environ.get("DOWNLOAD_MAX_AGE", 3600))
+
+
+def _content_disposition(name):
+    try:
+        name.encode("latin-1")
+        return f'attachment; filename="{name}"'
+    except UnicodeEncodeError:
+        ascii_name = name.encode("ascii", "ignore").decode("ascii")
+        return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(name)}"
+
+
+def _strong_etag(st):
+    return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def _read_range(f, length, chunk_size=64 * 1024):
+    try:
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _file_body(f, length, size):
+    # gunicorn hace sendfile desde la posición actual del archivo y corta en
+    # Content-Length, así que sirve también para rangos. Otros servidores solo
+    # reciben el file_wrapper para el archivo completo.
+    server = request.environ.get("SERVER_SOFTWARE", "")
+    if length == size or server.startswith("gunicorn"):
+        return wrap_file(request.environ, f)
+    return _read_range(f, length)
+
+
+def serve_file(file_path, relative_path):
+    st = os.stat(file_path)
+    name = os.path.basename(file_path)
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    if SENDFILE_MODE == "x-accel":
+        # nginx hace la transferencia (con Range, ETag y Last-Modified)
+        response = Response(status=200, mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = X_ACCEL_PREFIX + quote(relative_path)
+        response.headers["Content-Disposition"] = _content_disposition(name)
+        return response
+
+    if SENDFILE_MODE == "x-sendfile":
+        response = Response(status=200, mimetype=mimetype)
+        response.headers["X-Sendfile"] = os.path.abspath(file_path)
+        response.headers["Content-Disposition"] = _content_disposition(name)
+        return response
+
+    etag = _strong_etag(st)
+    size = st.st_size
+    start, stop = 0, size
+    status = 200
+
+    # If-Range: solo se respeta el rango si el cliente tiene esta versión,
+    # por ETag o por la fecha exacta de Last-Modified
+    byte_range = request.range
+    if_range = request.if_range
+    if byte_range is not None and if_range.etag is not None and if_range.etag != etag:
+        byte_range = None
+    if byte_range is not None and if_range.date is not None and int(if_range.date.timestamp()) != int(st.st_mtime):
+        byte_range = None
+    # Varios rangos (multipart/byteranges) no se sirven: se responde con el
+    # archivo completo, como permite la RFC 9110
+    if byte_range is not None and len(byte_range.ranges) != 1:
+        byte_range = None
+    if byte_range is not None:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            response = Response(status=416)
+            response.headers["Content-Range"] = f"bytes */{size}"
+            return response
+        start, stop = bounds
+        status = 206
+
+    f = open(file_path, "rb")
+    f.seek(start)
+    response = Response(
+        _file_body(f, stop - start, size), status=status, mimetype=mimetype, direct_passthrough=True
+    )
+    response.content_length = stop - start
+    if status == 206:
+        response.content_range = ContentRange("bytes", start, stop, size)
+    response.accept_ranges = "bytes"
+    response.headers["Content-Disposition"] = _content_disposition(name)
+    response.set_etag(etag)
+    response.last_modified = int(st.st_mtime)
+    response.cache_control.public = True
+    response.cache_control.max_age = DOWNLOAD_MAX_AGE
+
+    # 304 si el cliente ya tiene el archivo; el rango ya se aplicó arriba
+    return response.make_conditional(request)
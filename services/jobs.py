@@ -0,0 +1,280 @@
+# services/jobs.py
+# Cola de trabajos persistente (SQLite) para los procesos largos como la
+# descarga de álbumes. El endpoint encola y responde 202; los hilos de este
+# proceso ejecutan el trabajo e informan del progreso en la base de datos.
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics
+from services.config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = os.environ.get("JOBS_DB", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# Un trabajo "running" sin latido durante este tiempo se considera huérfano
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 300))
+JOB_POLL_SECONDS = int(os.environ.get("JOB_POLL_SECONDS", 15))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobStore:
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL,"
+            " params TEXT NOT NULL, status TEXT NOT NULL, progress TEXT NOT NULL,"
+            " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_key_status ON jobs(key, status)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind, key, params):
+        # Si ya hay un trabajo idéntico en curso se reutiliza
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (key, *ACTIVE_STATES)
+            ).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return self._to_dict(row), False
+
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, key, params, status, progress, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, key, json.dumps(params), QUEUED, "{}", now, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id), True
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim(self, job_id):
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?"
+            " WHERE id = ? AND status = ?",
+            (RUNNING, time.time(), job_id, QUEUED)
+        )
+        return cursor.rowcount == 1
+
+    def set_progress(self, job_id, progress):
+        self._conn().execute(
+            "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(progress), time.time(), job_id)
+        )
+
+    def heartbeat(self, job_ids):
+        now = time.time()
+        for job_id in job_ids:
+            self._conn().execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?", (now, job_id, RUNNING)
+            )
+
+    def finish(self, job_id, result):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+            (DONE, json.dumps(result), time.time(), job_id)
+        )
+
+    def fail(self, job_id, error):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (FAILED, error, time.time(), job_id)
+        )
+
+    def recover_stale(self):
+        # Devuelve a la cola los trabajos cuyo proceso murió (p. ej. un reinicio)
+        conn = self._conn()
+        limit = time.time() - JOB_STALE_SECONDS
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = 'Demasiados intentos' WHERE status = ?"
+            " AND updated_at < ? AND attempts >= ?",
+            (FAILED, RUNNING, limit, JOB_MAX_ATTEMPTS)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ? WHERE status = ? AND updated_at < ?",
+            (QUEUED, RUNNING, limit)
+        )
+        rows = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))
+        return [row["id"] for row in rows]
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "params": json.loads(row["params"]),
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+
+class JobContext:
+    # Lo recibe cada handler para informar del progreso del trabajo
+    def __init__(self, store, job):
+        self.store = store
+        self.job_id = job["job_id"]
+        self.params = job["params"]
+        self.progress = job["progress"] or {}
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            self.progress.update(fields)
+            self.store.set_progress(self.job_id, self.progress)
+
+    def track(self, position, state, **fields):
+        # Estado por pista: {"tracks": {"1": {"state": "done", ...}}}
+        with self._lock:
+            tracks = self.progress.setdefault("tracks", {})
+            entry = tracks.setdefault(str(position), {})
+            entry.update(state=state, **fields)
+            self.progress["completed"] = sum(1 for t in tracks.values() if t["state"] in ("done", "failed"))
+            self.store.set_progress(self.job_id, self.progress)
+
+
+_handlers = {}
+_store = None
+_executor = None
+_running = set()
+_pending = set()
+_state_lock = threading.Lock()
+
+
+def register_handler(kind, handler):
+    _handlers[kind] = handler
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _state_lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _state_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+
+def _enqueue(job_id):
+    with _state_lock:
+        if job_id in _pending:
+            return
+        _pending.add(job_id)
+    _get_executor().submit(_run, job_id)
+
+
+def submit(kind, key, params):
+    job, created = get_store().create(kind, key, params)
+    if created:
+        _enqueue(job["job_id"])
+        logger.info(f"Trabajo {job['job_id']} encolado ({key})")
+    else:
+        logger.info(f"Reutilizando trabajo en curso {job['job_id']} ({key})")
+    return job, created
+
+
+def get_job(job_id):
+    return get_store().get(job_id)
+
+
+def _run(job_id):
+    with _state_lock:
+        _pending.discard(job_id)
+    store = get_store()
+    if not store.claim(job_id):
+        return  # Otro proceso lo ha tomado
+    job = store.get(job_id)
+    handler = _handlers.get(job["kind"])
+    if handler is None:
+        store.fail(job_id, f"Tipo de trabajo desconocido: {job['kind']}")
+        return
+
+    with _state_lock:
+        _running.add(job_id)
+    metrics.JOBS_IN_FLIGHT.inc(kind=job["kind"])
+    try:
+        result = handler(JobContext(store, job))
+        store.finish(job_id, result)
+        logger.info(f"Trabajo {job_id} completado")
+    except Exception as e:
+        logger.error(f"Trabajo {job_id} fallido: {e}", exc_info=True)
+        store.fail(job_id, str(e))
+    finally:
+        metrics.JOBS_IN_FLIGHT.dec(kind=job["kind"])
+        with _state_lock:
+            _running.discard(job_id)
+
+
+def _supervise():
+    while True:
+        try:
+            store = get_store()
+            with _state_lock:
+                running = list(_running)
+            store.heartbeat(running)
+            for job_id in store.recover_stale():
+                _enqueue(job_id)
+        except Exception as e:
+            logger.error(f"Error supervisando trabajos: {e}")
+        time.sleep(JOB_POLL_SECONDS)
+
+
+_supervisor = None
+
+
+def start():
+    # Recupera los trabajos pendientes y mantiene el latido de los activos
+    global _supervisor
+    with _state_lock:
+        if _supervisor is not None:
+            return
+        _supervisor = threading.Thread(target=_supervise, name="job-supervisor", daemon=True)
+        _supervisor.start()
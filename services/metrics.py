@@ -0,0 +1,290 @@
+# services/metrics.py
+# Métricas en formato de texto de Prometheus. Cada proceso acumula sus
+# valores en memoria (un lock y una suma por observación) y los vuelca
+# periódicamente a un JSON propio en METRICS_DIR; /metrics suma los de
+# todos los workers de gunicorn vivos.
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+from services.config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(DATA_DIR, "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+
+# Segundos; cubren desde una respuesta de caché hasta un álbum completo
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = {}  # nombre -> métrica
+_lock = threading.Lock()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}  # tupla de etiquetas ordenadas -> valor
+        _registry[name] = self
+
+    def _snapshot(self):
+        with _lock:
+            return [[dict(labels), value] for labels, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [conteos por bucket (el último es +Inf), suma, total]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _snapshot(self):
+        with _lock:
+            return [[dict(labels), [list(counts), total, count]] for labels, (counts, total, count) in self._values.items()]
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Duración de las peticiones HTTP por ruta")
+REQUESTS = Counter("http_requests_total", "Peticiones HTTP por ruta, método y código")
+STAGE_LATENCY = Histogram("pipeline_stage_duration_seconds", "Duración de cada etapa de los pipelines de descarga y metadatos")
+UPSTREAM_LATENCY = Histogram("deezer_request_duration_seconds", "Duración de las peticiones a la API de Deezer")
+UPSTREAM_RESPONSES = Counter("deezer_responses_total", "Respuestas de la API de Deezer por código de estado")
+UPSTREAM_RETRIES = Counter("deezer_retries_total", "Reintentos de peticiones a Deezer por motivo")
+CACHE_LOOKUPS = Counter("metadata_cache_lookups_total", "Consultas a la caché de metadatos por resultado")
+TRACK_STORE_LOOKUPS = Counter("track_store_lookups_total", "Consultas al almacén de pistas por resultado")
+PREVIEW_LOOKUPS = Counter("preview_clip_lookups_total", "Clips de preview servidos por nivel (memory, disk, upstream)")
+PREWARM_FETCHES = Counter("prewarm_fetches_total", "Recursos precargados en segundo plano por tipo y resultado")
+JOBS_IN_FLIGHT = Gauge("jobs_in_flight", "Trabajos en ejecución por tipo")
+DEEZER_SESSIONS = Gauge("deezer_sessions", "Sesiones de Deezer abiertas por estado (in_use, idle)")
+DEEZER_SESSION_POOL_SIZE = Gauge("deezer_session_pool_size", "Sesiones de Deezer como máximo")
+
+
+def stage(pipeline, name):
+    # with metrics.stage("album", "upload"): ...
+    return STAGE_LATENCY.time(pipeline=pipeline, stage=name)
+
+
+# --- Volcado por proceso ---
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def _session_gauges():
+    # El pool es de cada proceso; al sumar los workers queda el total
+    from services import deezer_session
+
+    stats = deezer_session.get_pool().stats()
+    DEEZER_SESSIONS.set(stats["created"] - stats["idle"], state="in_use")
+    DEEZER_SESSIONS.set(stats["idle"], state="idle")
+    DEEZER_SESSION_POOL_SIZE.set(stats["size"])
+
+
+def flush():
+    _session_gauges()
+    snapshot = {
+        "pid": os.getpid(),
+        "time": time.time(),
+        "metrics": {
+            name: {"kind": metric.kind, "help": metric.help, "values": metric._snapshot()}
+            for name, metric in _registry.items()
+        },
+    }
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load_snapshots():
+    snapshots = []
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(METRICS_DIR, filename)
+        try:
+            pid = int(filename[:-5])
+            # Los workers que ya no existen dejan de contar
+            if pid != os.getpid() and not _pid_alive(pid):
+                os.remove(path)
+                continue
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (ValueError, OSError):
+            continue
+    return snapshots
+
+
+def _merge(snapshots):
+    merged = {}  # nombre -> {"kind", "help", "values": {tupla: valor}}
+    for snapshot in snapshots:
+        for name, data in snapshot["metrics"].items():
+            target = merged.setdefault(name, {"kind": data["kind"], "help": data["help"], "values": {}})
+            for labels, value in data["values"]:
+                key = tuple(sorted(labels.items()))
+                current = target["values"].get(key)
+                if current is None:
+                    target["values"][key] = value
+                elif data["kind"] == "histogram":
+                    counts = [a + b for a, b in zip(current[0], value[0])]
+                    target["values"][key] = [counts, current[1] + value[1], current[2] + value[2]]
+                else:
+                    target["values"][key] = current + value
+    return merged
+
+
+# --- Formato de texto de Prometheus ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _render_metric(lines, name, kind, help, values):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {kind}")
+    for key, value in sorted(values.items()):
+        if kind != "histogram":
+            lines.append(f"{name}{_labels(key)} {_format_number(value)}")
+            continue
+        counts, total, count = value
+        metric = _registry.get(name)
+        buckets = metric.buckets if metric is not None else DEFAULT_BUCKETS
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_labels(key + (('le', _format_number(float(bound))),))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_labels(key)} {_format_number(total)}")
+        lines.append(f"{name}_count{_labels(key)} {count}")
+
+
+def _storage_gauges(lines):
+    # El uso de disco lo calcula el barrido; se lee de sus estadísticas
+    from services import storage
+
+    stats = storage.get_stats()
+    managers = stats.get("managers", {})
+    gauges = (
+        ("storage_bytes", "Bytes ocupados por directorio gestionado", "bytes"),
+        ("storage_files", "Archivos por directorio gestionado", "files"),
+        ("storage_max_bytes", "Presupuesto de bytes por directorio gestionado", "max_bytes"),
+    )
+    for name, help, field in gauges:
+        values = {(("dir", manager),): data.get(field, 0) for manager, data in managers.items()}
+        _render_metric(lines, name, "gauge", help, values)
+    values = {(("dir", manager),): data.get("evicted_total", 0) for manager, data in managers.items()}
+    _render_metric(lines, "storage_evicted_total", "counter", "Entradas expulsadas por el barrido", values)
+    disk = stats.get("disk")
+    if disk:
+        _render_metric(lines, "disk_free_bytes", "gauge", "Espacio libre en el disco de descargas", {(): disk["free"]})
+        _render_metric(lines, "disk_used_bytes", "gauge", "Espacio usado en el disco de descargas", {(): disk["used"]})
+
+
+def render():
+    flush()
+    lines = []
+    for name, data in sorted(_merge(_load_snapshots()).items()):
+        _render_metric(lines, name, data["kind"], data["help"], data["values"])
+    try:
+        _storage_gauges(lines)
+    except Exception as e:
+        logger.error(f"Error leyendo estadísticas de disco: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Error volcando métricas: {e}")
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def start():
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flusher", daemon=True)
+            _flusher.start()
@@ -0,0 +1,44 @@
+# services/offload.py
+# Con los workers gevent de gunicorn (WORKER_CLASS=gevent) todas las
+# peticiones comparten un bucle de eventos: la E/S de red es cooperativa,
+# pero el trabajo de CPU o las llamadas que bloquean de verdad (escritura
+# de etiquetas y ZIP, flock) pararían a todas.
+# run_blocking() las ejecuta en el pool de hilos nativos de gevent y espera
+# sin bloquear el bucle. Sin gevent es una llamada directa.
+#
+# La función delegada no debe usar locks ni eventos del proceso: con el
+# monkey patching son primitivas de gevent y no cruzan hilos nativos.
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_THREADS = int(os.environ.get("OFFLOAD_THREADS", 16))
+
+_threadpool = None
+
+
+def gevent_active():
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+
+    return monkey.is_module_patched("socket")
+
+
+def _get_threadpool():
+    global _threadpool
+    if _threadpool is None:
+        from gevent import get_hub
+
+        _threadpool = get_hub().threadpool
+        _threadpool.maxsize = OFFLOAD_THREADS
+        logger.info(f"Pool de hilos nativos para trabajo bloqueante: {OFFLOAD_THREADS}")
+    return _threadpool
+
+
+def run_blocking(fn, *args, **kwargs):
+    if not gevent_active():
+        return fn(*args, **kwargs)
+    return _get_threadpool().apply(fn, args, kwargs)
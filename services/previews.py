@@ -0,0 +1,198 @@
+# services/previews.py
+# Previews de 30 s servidos por el propio servicio, en tres niveles:
+#  - La URL firmada de cada preview se guarda en la caché de metadatos hasta
+#    que caduca (exp= dentro de hdnea), así /song-preview/<id> no consulta
+#    Deezer mientras siga siendo válida. Los charts y el top de artista ya
+#    traen las URLs y las dejan guardadas.
+#  - Los clips se guardan en disco (PREVIEW_DIR); el barrido de
+#    services/storage mantiene el presupuesto expulsando los menos usados.
+#  - Los clips de las pistas de los charts, que los clientes empiezan a
+#    reproducir todos a la vez, se quedan además en memoria.
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from urllib.parse import parse_qs, urlparse
+
+from services import metrics
+from services.cache import TTL, MemoryCache, get_cache
+from services.config import DATA_DIR
+from services.deezer_client import DeezerAPIError, get_bytes, get_json
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = os.environ.get("PREVIEW_DIR", os.path.join(DATA_DIR, "previews"))
+PREVIEW_HOT_MAX_BYTES = int(os.environ.get("PREVIEW_HOT_MAX_BYTES", 32 * 1024 * 1024))
+# La URL se da por caducada este margen antes de su exp=
+PREVIEW_URL_MARGIN = int(os.environ.get("PREVIEW_URL_MARGIN", 60))
+# Un clip no cambia: en memoria solo lo limita el tamaño del conjunto
+HOT_TTL = 24 * 3600
+
+_hot = MemoryCache(PREVIEW_HOT_MAX_BYTES)
+_hot_ids = set()
+_hot_lock = threading.Lock()
+
+# Una sola descarga por clip entre hilos y entre workers
+_flights = SingleFlight()
+
+
+def parse_expiry(url):
+    # ...mp3?hdnea=exp=1700000000~acl=/api/1/1/*~data=...~hmac=...
+    query = parse_qs(urlparse(url).query)
+    for token in query.get("hdnea", []):
+        match = re.search(r"(?:^|~)exp=(\d+)", token)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def clip_path(song_id):
+    # Mismo reparto en subcarpetas que el almacén de pistas
+    song_id = str(song_id)
+    return os.path.join(PREVIEW_DIR, song_id[-2:].zfill(2), f"{song_id}.mp3")
+
+
+def _url_key(song_id):
+    return f"preview-url:{song_id}"
+
+
+def url_ttl(expires, now=None):
+    # Segundos que la URL sigue siendo utilizable
+    if not expires:
+        return TTL["track"]
+    return max(0, int(expires - (now or time.time()) - PREVIEW_URL_MARGIN))
+
+
+def _store_url(song_id, url, now=None):
+    # url None también se guarda: la canción no tiene preview
+    expires = parse_expiry(url) if url else None
+    ttl = url_ttl(expires, now)
+    if ttl > 0:
+        get_cache().set(_url_key(song_id), json.dumps({"url": url, "expires": expires}).encode("utf-8"), ttl)
+    return {"url": url, "expires": expires}
+
+
+def cached_url(song_id):
+    # {"url", "expires"} o None si no está en la caché
+    cached = get_cache().get(_url_key(song_id))
+    return json.loads(cached) if cached is not None else None
+
+
+def remember(tracks, hot=False):
+    # Guarda las URLs que ya vienen en un listado de pistas; con hot=True
+    # esas pistas pasan a ser el conjunto caliente en memoria
+    now = time.time()
+    ids = []
+    for track in tracks:
+        if not isinstance(track, dict) or not track.get("id") or not track.get("preview"):
+            continue
+        ids.append(str(track["id"]))
+        entry = cached_url(track["id"])
+        if entry is None or entry["url"] != track["preview"]:
+            _store_url(track["id"], track["preview"], now)
+    if hot:
+        mark_hot(ids)
+
+
+def preview_url(song_id, refresh=False):
+    # {"url", "expires"} de la canción; refresh=True ignora las cachés
+    # (la URL guardada dejó de ser válida antes de tiempo)
+    if not refresh:
+        entry = cached_url(song_id)
+        if entry is not None:
+            return entry
+        track = get_json(f"track/{song_id}", ttl=TTL["track"])
+    else:
+        track = get_json(f"track/{song_id}")
+    return _store_url(song_id, track.get("preview") or None)
+
+
+def mark_hot(ids):
+    global _hot_ids
+    ids = set(ids)
+    with _hot_lock:
+        stale, _hot_ids = _hot_ids - ids, ids
+    for song_id in stale:
+        _hot.delete(song_id)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _exists(path):
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+def has_clip(song_id):
+    # El clip ya está en memoria o en disco
+    return _hot.get(str(song_id)) is not None or _exists(clip_path(song_id))
+
+
+def _fetch_clip(song_id):
+    # Otro worker puede haberlo descargado mientras esperábamos el lock
+    path = clip_path(song_id)
+    if _exists(path):
+        return path
+
+    entry = preview_url(song_id)
+    if not entry["url"]:
+        return None
+    try:
+        data = get_bytes(entry["url"])
+    except DeezerAPIError as e:
+        # 403/410: la firma caducó antes de lo indicado; se pide otra URL
+        if e.status_code not in (403, 410):
+            raise
+        logger.info(f"URL de preview caducada para {song_id}, renovando")
+        entry = preview_url(song_id, refresh=True)
+        if not entry["url"]:
+            return None
+        data = get_bytes(entry["url"])
+    if not data:
+        return None
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def get_clip(song_id):
+    # (bytes, None) si el clip está en memoria, (None, ruta) si está en
+    # disco y (None, None) si la canción no tiene preview
+    song_id = str(song_id)
+    data = _hot.get(song_id)
+    if data is not None:
+        metrics.PREVIEW_LOOKUPS.inc(result="memory")
+        return data, None
+
+    path = clip_path(song_id)
+    if _exists(path):
+        metrics.PREVIEW_LOOKUPS.inc(result="disk")
+    else:
+        metrics.PREVIEW_LOOKUPS.inc(result="upstream")
+        path = _flights.do(f"preview:{song_id}", _fetch_clip, song_id, cross_process=True)
+        if path is None:
+            return None, None
+
+    if song_id in _hot_ids:
+        data = _read(path)
+        _hot.set(song_id, data, HOT_TTL)
+        return data, None
+    return None, path
@@ -0,0 +1,155 @@
+# services/prewarm.py
+# Precarga en segundo plano de lo primero que abre cada cliente: el chart
+# global y los álbumes, artistas y previews que enlaza. Cada PREWARM_INTERVAL
+# se refresca el chart y se piden los recursos que faltan en caché o solo
+# tienen la copia pasada de TTL, con un presupuesto de peticiones a Deezer
+# por ciclo y una concurrencia acotada. Con la caché compartida (sqlite) un
+# solo worker hace cada ciclo; con la de memoria cada worker precarga la suya.
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics, previews
+from services.cache import CACHE_BACKEND, TTL
+from services.config import DATA_DIR
+from services.deezer_client import needs_refresh, refresh_json
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre ciclos; 0 lo desactiva
+PREWARM_INTERVAL = int(os.environ.get("PREWARM_INTERVAL", max(60, TTL["chart"] - 60)))
+# Peticiones a Deezer como máximo por ciclo (chart, álbumes, artistas, previews)
+PREWARM_BUDGET = int(os.environ.get("PREWARM_BUDGET", 100))
+PREWARM_CONCURRENCY = int(os.environ.get("PREWARM_CONCURRENCY", 4))
+PREWARM_PREVIEWS = os.environ.get("PREWARM_PREVIEWS", "1") == "1"
+
+STATE_PATH = os.path.join(DATA_DIR, "prewarm_state.json")
+LOCK_PATH = os.path.join(DATA_DIR, "prewarm.lock")
+
+CHART_PATH = "chart/0/tracks"
+
+
+def _load_state():
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    tmp_path = f"{STATE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def plan(tracks):
+    # [(tipo, id, función, args)] en orden del chart: primero lo que
+    # aparece más arriba, que es lo que más se abre
+    tasks = []
+    seen = set()
+
+    def add(kind, item_id, fn, *args):
+        if item_id and (kind, item_id) not in seen:
+            seen.add((kind, item_id))
+            tasks.append((kind, item_id, fn, args))
+
+    for track in tracks:
+        album_id = (track.get("album") or {}).get("id")
+        if album_id and needs_refresh(f"album/{album_id}"):
+            add("album", album_id, refresh_json, f"album/{album_id}", None, None, TTL["album"])
+        artist_id = (track.get("artist") or {}).get("id")
+        if artist_id and needs_refresh(f"artist/{artist_id}"):
+            add("artist", artist_id, refresh_json, f"artist/{artist_id}", None, None, TTL["artist"])
+        if PREWARM_PREVIEWS and track.get("preview") and not previews.has_clip(track.get("id")):
+            add("preview", track["id"], previews.get_clip, track["id"])
+    return tasks
+
+
+def _run_task(kind, item_id, fn, args):
+    try:
+        fn(*args)
+        metrics.PREWARM_FETCHES.inc(kind=kind, result="ok")
+        return True
+    except Exception as e:
+        logger.warning(f"Precarga de {kind} {item_id} fallida: {e}")
+        metrics.PREWARM_FETCHES.inc(kind=kind, result="error")
+        return False
+
+
+def run_once():
+    started = time.time()
+    # El chart se pide siempre: es lo que hay que tener fresco
+    chart = refresh_json(CHART_PATH, ttl=TTL["chart"])
+    metrics.PREWARM_FETCHES.inc(kind="chart", result="ok")
+    tracks = chart.get("data", [])
+    previews.remember(tracks, hot=True)
+
+    tasks = plan(tracks)
+    budget = max(0, PREWARM_BUDGET - 1)
+    selected, skipped = tasks[:budget], tasks[budget:]
+    ok = 0
+    if selected:
+        with ThreadPoolExecutor(max_workers=max(1, PREWARM_CONCURRENCY), thread_name_prefix="prewarm") as pool:
+            ok = sum(pool.map(lambda task: _run_task(*task), selected))
+    if skipped:
+        logger.info(f"Precarga: {len(skipped)} recursos fuera del presupuesto de este ciclo")
+
+    result = {
+        "last_run": started,
+        "duration": round(time.time() - started, 3),
+        "chart_tracks": len(tracks),
+        "fetched": ok,
+        "failed": len(selected) - ok,
+        "skipped_budget": len(skipped),
+    }
+    logger.info(f"Precarga completada: {ok}/{len(selected)} recursos en {result['duration']} s")
+    return result
+
+
+def _cycle():
+    if CACHE_BACKEND != "sqlite":
+        return run_once()
+    # Caché compartida: un solo worker por intervalo
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(LOCK_PATH, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            if time.time() - _load_state().get("last_run", 0) < PREWARM_INTERVAL * 0.9:
+                return None
+            state = run_once()
+            _save_state(state)
+            return state
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _prewarm_loop():
+    while True:
+        try:
+            _cycle()
+        except Exception as e:
+            logger.error(f"Error en la precarga: {e}", exc_info=True)
+        time.sleep(PREWARM_INTERVAL)
+
+
+_prewarmer = None
+_prewarmer_lock = threading.Lock()
+
+
+def start():
+    global _prewarmer
+    if PREWARM_INTERVAL <= 0:
+        return
+    with _prewarmer_lock:
+        if _prewarmer is None:
+            _prewarmer = threading.Thread(target=_prewarm_loop, name="prewarmer", daemon=True)
+            _prewarmer.start()
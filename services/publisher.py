@@ -0,0 +1,169 @@
+# services/publisher.py
+# Publicación de artefactos (ZIPs de álbumes). El archivo se sube en streaming
+# desde disco con un cuerpo multipart generado por bloques, de modo que nunca
+# se carga entero en memoria.
+import os
+import time
+import uuid
+import random
+import logging
+from abc import ABC, abstractmethod
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+QUAX_UPLOAD_URL = os.environ.get("QUAX_UPLOAD_URL", "https://qu.ax/upload.php")
+PUBLISH_MAX_RETRIES = int(os.environ.get("PUBLISH_MAX_RETRIES", 3))
+PUBLISH_TIMEOUT = float(os.environ.get("PUBLISH_TIMEOUT", 300))
+CHUNK_SIZE = 64 * 1024
+
+
+class MultipartFileStream:
+    # Objeto tipo archivo con longitud conocida: requests envía
+    # Content-Length y lo lee por bloques al transmitir
+    def __init__(self, file_path, filename, field_name, content_type, fields=None, progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.progress = progress
+
+        head = b""
+        for name, value in (fields or {}).items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self._file = open(file_path, "rb")
+        self._file_size = os.fstat(self._file.fileno()).st_size
+        self._parts = [head, None, tail]  # None = contenido del archivo
+        self._part = 0
+        self._offset = 0
+        self.total = len(head) + self._file_size + len(tail)
+        self.sent = 0
+
+    def __len__(self):
+        return self.total
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        while self._part < len(self._parts):
+            part = self._parts[self._part]
+            if part is None:
+                chunk = self._file.read(size)
+                if not chunk:
+                    self._part += 1
+                    continue
+            else:
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                if self._offset >= len(part):
+                    self._part += 1
+                    self._offset = 0
+                if not chunk:
+                    continue
+            self.sent += len(chunk)
+            if self.progress:
+                self.progress(self.sent, self.total)
+            return chunk
+        return b""
+
+    def close(self):
+        self._file.close()
+
+
+class ArtifactPublisher(ABC):
+    # Interfaz: publish() devuelve {'download_url': ..., 'delete_url': ...}
+    @abstractmethod
+    def publish(self, file_path, filename, progress=None):
+        pass
+
+
+class QuaxPublisher(ArtifactPublisher):
+    def __init__(self, upload_url=QUAX_UPLOAD_URL, expiry_days=30):
+        self.upload_url = upload_url
+        self.expiry_days = expiry_days
+        self.session = requests.Session()
+
+    def publish(self, file_path, filename, progress=None):
+        file_size = os.path.getsize(file_path)
+        logger.info(f"Subiendo {filename} ({file_size} bytes) a {self.upload_url}")
+        if file_size == 0:
+            raise Exception("El archivo ZIP está vacío")
+
+        # qu.ax no admite reanudar subidas: ante un fallo se reintenta
+        # completa desde disco con backoff
+        attempt = 0
+        while True:
+            try:
+                return self._upload(file_path, filename, progress)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500 and e.response.status_code != 429:
+                    raise
+                error = e
+            if attempt >= PUBLISH_MAX_RETRIES:
+                raise error
+            attempt += 1
+            delay = random.uniform(0, 2 ** attempt)
+            logger.warning(f"Reintentando subida de {filename} en {delay:.1f}s ({attempt}/{PUBLISH_MAX_RETRIES}): {error}")
+            time.sleep(delay)
+
+    def _upload(self, file_path, filename, progress):
+        body = MultipartFileStream(
+            file_path, filename, "files[]", "application/zip",
+            fields={"expiry": str(self.expiry_days)}, progress=progress
+        )
+        try:
+            response = self.session.post(
+                self.upload_url,
+                data=body,
+                headers={
+                    "Content-Type": body.content_type,
+                    "User-Agent": "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Mobile Safari/537.36",
+                    "Referer": "https://qu.ax/"
+                },
+                timeout=(10, PUBLISH_TIMEOUT)
+            )
+        finally:
+            body.close()
+        response.raise_for_status()
+
+        json_response = response.json()
+
+        # Verificar la estructura de la respuesta
+        if not json_response.get('success') or not json_response.get('files') or len(json_response['files']) == 0:
+            logger.error(f"Respuesta inesperada de qu.ax: {json_response}")
+            raise Exception("La estructura de la respuesta no es la esperada")
+
+        download_url = json_response['files'][0]['url']
+        logger.info(f"Subida exitosa. URL: {download_url}")
+        return {
+            'download_url': download_url,
+            'delete_url': ''  # qu.ax no parece proporcionar URL de eliminación
+        }
+
+
+_publisher = None
+
+
+def get_publisher():
+    global _publisher
+    if _publisher is None:
+        _publisher = QuaxPublisher()
+    return _publisher
+
+
+def set_publisher(publisher):
+    # Permite sustituir el destino (p. ej. un servidor local de pruebas)
+    global _publisher
+    _publisher = publisher
@@ -0,0 +1,99 @@
+# services/rate_limit.py
+# Almacenamiento del rate limiter compartido por todos los workers de
+# gunicorn. Con el almacenamiento en memoria por defecto cada worker lleva
+# su propia cuenta y los límites reales son N veces más laxos. Este backend
+# guarda los contadores de ventana fija en SQLite (en DATA_DIR) y se
+# registra en limits con el esquema "sqlite://", así que basta con la URI:
+#
+#   RATELIMIT_STORAGE_URI=sqlite:///ruta/ratelimit.sqlite3   (por defecto)
+#   RATELIMIT_STORAGE_URI=redis://host:6379                   (otro backend de limits)
+import os
+import time
+import random
+import sqlite3
+import threading
+
+from limits.storage import Storage
+
+from services.config import DATA_DIR
+
+RATELIMIT_DB = os.path.join(DATA_DIR, "ratelimit.sqlite3")
+RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", f"sqlite:///{os.path.abspath(RATELIMIT_DB)}")
+
+# Fracción de incrementos que además purgan las ventanas caducadas
+PURGE_PROBABILITY = 0.001
+
+
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # sqlite:///ruta/absoluta o sqlite://ruta/relativa
+        self.path = uri.split("://", 1)[1] if uri and "://" in uri else RATELIMIT_DB
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE serializa el leer-y-sumar entre procesos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM counters WHERE key = ? AND expires <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO counters (key, count, expires) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET count = count + excluded.count",
+                (key, amount, now + expiry)
+            )
+            count = conn.execute("SELECT count FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            if random.random() < PURGE_PROBABILITY:
+                conn.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT count FROM counters WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT expires FROM counters WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conn().execute("DELETE FROM counters").rowcount
+
+    def clear(self, key):
+        self._conn().execute("DELETE FROM counters WHERE key = ?", (key,))
@@ -0,0 +1,16 @@
+# services/responses.py
+import hashlib
+
+from flask import g, jsonify, request
+
+
+def cached_json(data, max_age):
+    # Respuesta JSON con ETag fuerte y Cache-Control; devuelve 304 si el
+    # cliente ya tiene esta versión (If-None-Match)
+    response = jsonify(data)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.public = True
+    # Copia pasada de TTL (stale-while-revalidate): el cliente debe
+    # revalidar en cuanto llegue la versión nueva
+    response.cache_control.max_age = 0 if g.get("cache_stale") else max_age
+    return response.make_conditional(request)
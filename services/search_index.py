@@ -0,0 +1,146 @@
+# services/search_index.py
+# Índice local de prefijos para el autocompletado. Se alimenta con los
+# artistas, álbumes y pistas de las búsquedas que ya pasaron por Deezer y
+# responde a /search/suggest sin salir del proceso. Las claves (nombre
+# normalizado y cada sufijo desde un límite de palabra, para que "beatles"
+# encuentre "The Beatles") van en un array ordenado; un prefijo es un rango
+# contiguo que se localiza con bisect.
+import os
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+
+SEARCH_INDEX_MAX_ENTRIES = int(os.environ.get("SEARCH_INDEX_MAX_ENTRIES", 50000))
+# Sufijos de palabra indexados por nombre ("the dark side of..." -> 4 claves)
+MAX_WORD_KEYS = 4
+# Claves revisadas como máximo por consulta (prefijos de una letra)
+MAX_SCAN = 2000
+
+SUGGEST_TYPES = ("artist", "album", "track")
+TYPE_ORDER = {"artist": 0, "album": 1, "track": 2}
+
+
+def normalize_query(query):
+    # Clave de caché: mayúsculas, espacios y formas Unicode no cambian el resultado
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def normalize_key(text):
+    # Clave de índice: además sin acentos ni signos de puntuación
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c if c.isalnum() else " " for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+
+def _entry(item):
+    kind = item.get("type")
+    if kind == "artist" and item.get("name"):
+        return {"type": "artist", "id": item["id"], "name": item["name"],
+                "picture": item.get("picture_medium"), "popularity": item.get("nb_fan", 0)}
+    if kind == "album" and item.get("title"):
+        return {"type": "album", "id": item["id"], "name": item["title"],
+                "artist": (item.get("artist") or {}).get("name"),
+                "cover": item.get("cover_medium"), "popularity": 0}
+    if kind == "track" and item.get("title"):
+        return {"type": "track", "id": item["id"], "name": item["title"],
+                "artist": (item.get("artist") or {}).get("name"),
+                "album": (item.get("album") or {}).get("title"),
+                "popularity": item.get("rank", 0)}
+    return None
+
+
+def _entries(items):
+    # Una pista también aporta su artista y su álbum
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        entry = _entry(item)
+        if entry is not None:
+            yield entry
+        if item.get("type") == "track":
+            for nested_type in ("artist", "album"):
+                nested = item.get(nested_type)
+                if isinstance(nested, dict) and nested.get("id"):
+                    nested = dict(nested, type=nested_type)
+                    if nested_type == "album":
+                        nested.setdefault("artist", item.get("artist"))
+                    entry = _entry(nested)
+                    if entry is not None:
+                        yield entry
+
+
+class SearchIndex:
+    def __init__(self, max_entries=SEARCH_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (tipo, id) -> entrada; orden de inserción
+        self._keys = []                 # [(clave, tipo, id)] ordenado
+        self._pending = []              # claves aún no mezcladas en _keys
+        self._renamed = set()           # entradas con claves del nombre anterior
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, items):
+        with self._lock:
+            for entry in _entries(items):
+                ref = (entry["type"], entry["id"])
+                previous = self._entries.pop(ref, None)
+                self._entries[ref] = entry
+                if previous is not None:
+                    if previous["name"] == entry["name"]:
+                        continue
+                    self._renamed.add(ref)
+                words = normalize_key(entry["name"]).split()
+                for start in range(min(len(words), MAX_WORD_KEYS)):
+                    self._pending.append((" ".join(words[start:]), entry["type"], entry["id"]))
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Se descartan las entradas más antiguas y se reconstruyen las claves
+        while len(self._entries) > self.max_entries * 0.9:
+            self._entries.popitem(last=False)
+        self._merge_pending()
+        self._keys = [k for k in self._keys if (k[1], k[2]) in self._entries]
+
+    def _merge_pending(self):
+        if self._renamed:
+            names = {ref: normalize_key(self._entries[ref]["name"]) for ref in self._renamed if ref in self._entries}
+            self._keys = [k for k in self._keys if (k[1], k[2]) not in names or names[(k[1], k[2])].endswith(k[0])]
+            self._renamed.clear()
+        if self._pending:
+            self._keys.extend(self._pending)
+            self._keys.sort()
+            self._pending = []
+
+    def suggest(self, prefix, limit=10, types=None):
+        prefix = normalize_key(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            self._merge_pending()
+            start = bisect.bisect_left(self._keys, (prefix,))
+            found = {}
+            for key, kind, item_id in self._keys[start:start + MAX_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                if types and kind not in types:
+                    continue
+                entry = self._entries.get((kind, item_id))
+                if entry is not None:
+                    found[(kind, item_id)] = entry
+        # Coincidencia exacta primero, luego tipo, popularidad y nombre más corto
+        ranked = sorted(
+            found.values(),
+            key=lambda e: (normalize_key(e["name"]) != prefix, TYPE_ORDER[e["type"]], -(e.get("popularity") or 0), len(e["name"]))
+        )
+        return [{k: v for k, v in entry.items() if k != "popularity"} for entry in ranked[:limit]]
+
+
+_index = SearchIndex()
+
+
+def get_index():
+    return _index
@@ -0,0 +1,117 @@
+# services/singleflight.py
+# Agrupa el trabajo idéntico concurrente: la primera llamada con una clave lo
+# ejecuta y las demás esperan y reciben el mismo resultado (o la misma
+# excepción). Con cross_process=True además se serializa entre workers de
+# gunicorn mediante un lock de archivo; en ese caso la función debe volver a
+# comprobar su caché/almacén, porque otro proceso puede haber terminado antes.
+import os
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from services import offload
+from services.config import DATA_DIR
+
+LOCK_DIR = os.environ.get("LOCK_DIR", os.path.join(DATA_DIR, "locks"))
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _lock_path(key):
+    return os.path.join(LOCK_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+
+
+def _same_file(f, path):
+    # El barrido pudo borrar el archivo entre el open y el flock
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+@contextmanager
+def file_lock(key):
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = _lock_path(key)
+    while True:
+        f = open(path, "a")
+        try:
+            # La espera puede durar toda una descarga de otro worker
+            offload.run_blocking(fcntl.flock, f.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            f.close()
+            raise
+        if _same_file(f, path):
+            break
+        f.close()
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+def sweep_locks(now, max_age, lock_dir=LOCK_DIR):
+    # Borra los archivos de lock sin usar desde hace max_age; solo los que
+    # nadie tiene tomados, y con el lock en la mano para que file_lock
+    # detecte el borrado y abra uno nuevo
+    removed = 0
+    if not os.path.isdir(lock_dir):
+        return removed
+    for name in os.listdir(lock_dir):
+        path = os.path.join(lock_dir, name)
+        try:
+            if not name.endswith(".lock") or os.stat(path).st_mtime > now - max_age:
+                continue
+            with open(path, "a") as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if _same_file(f, path):
+                    os.remove(path)
+                    removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, cross_process=False, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if cross_process:
+                with file_lock(key):
+                    call.result = fn(*args, **kwargs)
+            else:
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
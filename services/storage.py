@@ -0,0 +1,354 @@
+# services/storage.py
+# Control de espacio en disco: presupuesto de bytes y de archivos por
+# directorio, expulsión LRU por último acceso y barrido de restos de
+# descargas fallidas (carpetas temporales, ZIP a medias, .tmp).
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+from services import offload
+from services.config import DATA_DIR, DOWNLOAD_DIR
+from services.cover_cache import COVER_CACHE_DIR
+from services.previews import PREVIEW_DIR
+from services.singleflight import sweep_locks
+from services.track_store import TRACK_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+DOWNLOADS_MAX_BYTES = int(os.environ.get("DOWNLOADS_MAX_BYTES", 5 * 1024 ** 3))
+DOWNLOADS_MAX_FILES = int(os.environ.get("DOWNLOADS_MAX_FILES", 5000))
+TRACK_STORE_MAX_BYTES = int(os.environ.get("TRACK_STORE_MAX_BYTES", 10 * 1024 ** 3))
+TRACK_STORE_MAX_FILES = int(os.environ.get("TRACK_STORE_MAX_FILES", 50000))
+PREVIEW_MAX_BYTES = int(os.environ.get("PREVIEW_MAX_BYTES", 1024 ** 3))
+PREVIEW_MAX_FILES = int(os.environ.get("PREVIEW_MAX_FILES", 20000))
+COVER_DISK_MAX_BYTES = int(os.environ.get("COVER_DISK_MAX_BYTES", 256 * 1024 ** 2))
+COVER_DISK_MAX_FILES = int(os.environ.get("COVER_DISK_MAX_FILES", 5000))
+# Espacio libre mínimo; por debajo se barre antes de empezar una descarga
+MIN_FREE_BYTES = int(os.environ.get("MIN_FREE_BYTES", 512 * 1024 ** 2))
+SWEEP_INTERVAL = int(os.environ.get("SWEEP_INTERVAL", 300))
+# Nada modificado más recientemente que esto se borra (trabajos en curso
+# de otros workers, enlaces recién entregados al cliente)
+SWEEP_GRACE_SECONDS = int(os.environ.get("SWEEP_GRACE_SECONDS", 900))
+
+STATS_PATH = os.path.join(DATA_DIR, "storage_stats.json")
+SWEEP_LOCK_PATH = os.path.join(DATA_DIR, "storage_sweep.lock")
+LEASE_DIR = os.path.join(DATA_DIR, "leases")
+
+# Restos de trabajos interrumpidos
+PARTIAL_DIR_NAMES = (".tracks",)
+PARTIAL_DIR_PREFIXES = (".tmp-",)
+PARTIAL_FILE_SUFFIXES = (".tmp", ".part")
+
+
+def _last_access(st):
+    return max(st.st_atime, st.st_mtime)
+
+
+class StorageManager:
+    # La unidad de expulsión es cada entrada (carpeta o archivo) a
+    # unit_depth niveles de la raíz: 1 para las carpetas de ./downloads,
+    # 2 para los MP3 del almacén de pistas (repartidos en subcarpetas)
+    def __init__(self, name, root, max_bytes, max_files, unit_depth=1):
+        self.name = name
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.unit_depth = unit_depth
+
+    # Los leases son archivos en LEASE_DIR con flock compartido mientras la
+    # entrada está en uso, visibles para todos los workers; el barrido solo
+    # borra una entrada si consigue el lock exclusivo y lo mantiene mientras
+    # la borra, así que un lease nuevo espera a que termine
+    def _lease_path(self, entry):
+        digest = hashlib.sha1(entry.encode("utf-8")).hexdigest()
+        return os.path.join(LEASE_DIR, f"{self.name}-{digest}.lock")
+
+    def _open_locked(self, path, flags):
+        # El archivo pudo borrarse entre el open y el flock: se reintenta
+        while True:
+            f = open(path, "a")
+            try:
+                offload.run_blocking(fcntl.flock, f.fileno(), flags)
+            except BaseException:
+                f.close()
+                raise
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _release(self, path, f):
+        # El último en soltarlo borra el archivo
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(path)
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        finally:
+            f.close()
+
+    @contextmanager
+    def lease(self, *paths):
+        # Protege una o varias entradas del barrido mientras se están usando
+        os.makedirs(LEASE_DIR, exist_ok=True)
+        held = []
+        try:
+            for entry in dict.fromkeys(self._entry_for(path) for path in paths):
+                path = self._lease_path(entry)
+                held.append((path, self._open_locked(path, fcntl.LOCK_SH)))
+            yield
+        finally:
+            for path, f in held:
+                self._release(path, f)
+
+    @contextmanager
+    def _claim(self, entry):
+        # True si ningún worker tiene la entrada; el lock se mantiene
+        # mientras el barrido la borra
+        os.makedirs(LEASE_DIR, exist_ok=True)
+        path = self._lease_path(entry)
+        try:
+            f = self._open_locked(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f = None
+        try:
+            yield f is not None
+        finally:
+            if f is not None:
+                self._release(path, f)
+
+    def _entry_for(self, path):
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        return os.path.join(*rel.split(os.sep)[:self.unit_depth])
+
+    def _units(self):
+        units = [""]
+        for _ in range(self.unit_depth):
+            next_units = []
+            for unit in units:
+                path = os.path.join(self.root, unit)
+                if os.path.isdir(path):
+                    next_units.extend(os.path.join(unit, child) for child in os.listdir(path))
+            units = next_units
+        return units
+
+    def scan(self):
+        # [(entrada, bytes, archivos, último_acceso, última_modificación)]
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for entry in self._units():
+            path = os.path.join(self.root, entry)
+            try:
+                if os.path.isdir(path):
+                    size = files = 0
+                    accessed = modified = os.stat(path).st_mtime
+                    for dirpath, _, filenames in os.walk(path):
+                        for filename in filenames:
+                            st = os.stat(os.path.join(dirpath, filename))
+                            size += st.st_size
+                            files += 1
+                            accessed = max(accessed, _last_access(st))
+                            modified = max(modified, st.st_mtime)
+                else:
+                    st = os.stat(path)
+                    size, files = st.st_size, 1
+                    accessed, modified = _last_access(st), st.st_mtime
+            except FileNotFoundError:
+                continue  # Borrado mientras se recorría
+            entries.append((entry, size, files, accessed, modified))
+        return entries
+
+    def _remove(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def sweep_partials(self, now):
+        removed = 0
+        limit = now - SWEEP_GRACE_SECONDS
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for dirname in list(dirnames):
+                if dirname in PARTIAL_DIR_NAMES or dirname.startswith(PARTIAL_DIR_PREFIXES):
+                    path = os.path.join(dirpath, dirname)
+                    try:
+                        if os.stat(path).st_mtime < limit:
+                            with self._claim(self._entry_for(path)) as free:
+                                if free:
+                                    shutil.rmtree(path, ignore_errors=True)
+                                    dirnames.remove(dirname)
+                                    removed += 1
+                    except FileNotFoundError:
+                        pass
+            for filename in filenames:
+                if filename.endswith(PARTIAL_FILE_SUFFIXES):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        if os.stat(path).st_mtime < limit:
+                            with self._claim(self._entry_for(path)) as free:
+                                if free:
+                                    os.remove(path)
+                                    removed += 1
+                    except FileNotFoundError:
+                        pass
+        # Carpetas que quedaron vacías
+        for entry in self._units() if os.path.isdir(self.root) else []:
+            path = os.path.join(self.root, entry)
+            if os.path.isdir(path):
+                try:
+                    if not any(files for _, _, files in os.walk(path)) and os.stat(path).st_mtime < limit:
+                        with self._claim(entry) as free:
+                            if free:
+                                shutil.rmtree(path, ignore_errors=True)
+                                removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def enforce_budget(self, now, max_bytes=None, max_files=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_files = self.max_files if max_files is None else max_files
+        entries = self.scan()
+        total_bytes = sum(e[1] for e in entries)
+        total_files = sum(e[2] for e in entries)
+        evicted = evicted_bytes = 0
+
+        # Menos usadas primero
+        for entry, size, files, accessed, modified in sorted(entries, key=lambda e: e[3]):
+            if total_bytes <= max_bytes and total_files <= max_files:
+                break
+            if modified > now - SWEEP_GRACE_SECONDS:
+                continue
+            with self._claim(entry) as free:
+                if not free:
+                    continue
+                self._remove(os.path.join(self.root, entry))
+            total_bytes -= size
+            total_files -= files
+            evicted += 1
+            evicted_bytes += size
+            logger.info(f"[{self.name}] Expulsado {entry} ({size} bytes)")
+
+        return {
+            "bytes": total_bytes,
+            "files": total_files,
+            "entries": len(entries) - evicted,
+            "max_bytes": max_bytes,
+            "max_files": max_files,
+            "evicted": evicted,
+            "evicted_bytes": evicted_bytes,
+        }
+
+
+downloads = StorageManager("downloads", DOWNLOAD_DIR, DOWNLOADS_MAX_BYTES, DOWNLOADS_MAX_FILES)
+track_store = StorageManager("tracks", TRACK_STORE_DIR, TRACK_STORE_MAX_BYTES, TRACK_STORE_MAX_FILES, unit_depth=2)
+previews = StorageManager("previews", PREVIEW_DIR, PREVIEW_MAX_BYTES, PREVIEW_MAX_FILES, unit_depth=2)
+covers = StorageManager("covers", COVER_CACHE_DIR, COVER_DISK_MAX_BYTES, COVER_DISK_MAX_FILES)
+MANAGERS = (downloads, track_store, previews, covers)
+
+
+def touch(path):
+    # Marca un archivo como usado (los montajes con noatime no lo hacen solos)
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+    except OSError:
+        pass
+
+
+def _load_stats():
+    try:
+        with open(STATS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_stats(stats):
+    tmp_path = f"{STATS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, STATS_PATH)
+
+
+def sweep(aggressive=False, blocking=False):
+    # Solo un worker barre a la vez; los demás se lo saltan
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(SWEEP_LOCK_PATH, "a") as lock_file:
+        try:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            offload.run_blocking(fcntl.flock, lock_file.fileno(), flags)
+        except BlockingIOError:
+            return None
+
+        try:
+            now = time.time()
+            previous = _load_stats()
+            stats = {"last_sweep": now, "managers": {}}
+            for manager in MANAGERS:
+                prev = previous.get("managers", {}).get(manager.name, {})
+                orphans = manager.sweep_partials(now)
+                # Con poco disco libre se baja el presupuesto a la mitad
+                if aggressive:
+                    result = manager.enforce_budget(now, manager.max_bytes // 2, manager.max_files // 2)
+                else:
+                    result = manager.enforce_budget(now)
+                result["evicted_total"] = prev.get("evicted_total", 0) + result["evicted"]
+                result["evicted_bytes_total"] = prev.get("evicted_bytes_total", 0) + result["evicted_bytes"]
+                result["orphans_removed_total"] = prev.get("orphans_removed_total", 0) + orphans
+                stats["managers"][manager.name] = result
+            # Un archivo de lock por clave (pista, preview...): sin barrerlos
+            # se acumulan en LOCK_DIR
+            # (y los leases de workers que murieron sin soltarlos)
+            locks_removed = sweep_locks(now, SWEEP_GRACE_SECONDS) + sweep_locks(now, SWEEP_GRACE_SECONDS, LEASE_DIR)
+            stats["locks_removed_total"] = previous.get("locks_removed_total", 0) + locks_removed
+            usage = shutil.disk_usage(DOWNLOAD_DIR if os.path.isdir(DOWNLOAD_DIR) else ".")
+            stats["disk"] = {"total": usage.total, "used": usage.used, "free": usage.free}
+            _save_stats(stats)
+            return stats
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def ensure_space():
+    # Antes de una descarga: si queda poco disco se libera espacio ya
+    try:
+        if shutil.disk_usage(DOWNLOAD_DIR).free < MIN_FREE_BYTES:
+            logger.warning("Poco espacio libre en disco, barriendo descargas")
+            sweep(aggressive=True, blocking=True)
+    except Exception as e:
+        logger.error(f"Error comprobando el espacio en disco: {e}")
+
+
+def get_stats():
+    return _load_stats()
+
+
+def _sweep_loop():
+    while True:
+        try:
+            sweep()
+        except Exception as e:
+            logger.error(f"Error en el barrido de almacenamiento: {e}", exc_info=True)
+        time.sleep(SWEEP_INTERVAL)
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper():
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_loop, name="storage-sweeper", daemon=True)
+            _sweeper.start()
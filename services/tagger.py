@@ -0,0 +1,73 @@
+# services/tagger.py
+# Etiquetado ID3 en una sola pasada: se construye en memoria el conjunto
+# completo de frames ID3v2.3 (texto + portada) y se escribe una única vez.
+# Si la etiqueta nueva cabe en el relleno de la existente, mutagen la
+# reescribe en su sitio sin tocar el audio.
+import logging
+
+from mutagen.id3 import ID3, ID3NoHeaderError, TIT2, TPE1, TALB, TRCK, TDRC, APIC
+
+from services import offload
+from services.cover_cache import get_cover
+
+logger = logging.getLogger(__name__)
+
+def _artists(track):
+    contributors = track.get("contributors") or []
+    artists = [artist["name"] for artist in contributors if artist.get("name")]
+    if not artists:
+        artists = [track.get("artist", {}).get("name", "Unknown")]
+    return ", ".join(artists)
+
+
+def build_frames(track, album_data, track_number=None, cover_data=None):
+    if track_number is None:
+        track_number = track.get("track_position")
+
+    frames = [
+        TIT2(encoding=3, text=track.get("title", "Unknown Title")),
+        TPE1(encoding=3, text=_artists(track)),
+        TALB(encoding=3, text=album_data.get("title", "Unknown Album")),
+    ]
+    if track_number:
+        frames.append(TRCK(encoding=3, text=str(track_number)))
+    year = (album_data.get("release_date") or "").split("-")[0]
+    if year:
+        frames.append(TDRC(encoding=3, text=year))
+    if cover_data:
+        frames.append(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover_data))
+    return frames
+
+
+def _album_cover(album_data):
+    cover_url = album_data.get("cover_xl") or album_data.get("cover_big")
+    if not cover_url:
+        return None
+    try:
+        return get_cover(cover_url)
+    except Exception as e:
+        # Sin portada la pista sigue siendo válida
+        logger.error(f"Error obteniendo portada {cover_url}: {e}")
+        return None
+
+
+def _write_tags(file_path, frames):
+    try:
+        tags = ID3(file_path)
+    except ID3NoHeaderError:
+        tags = ID3()
+    for frame in frames:
+        tags.setall(frame.FrameID, [frame])
+    # save() convierte a v2.3 (TDRC -> TYER, UTF-8 -> UTF-16) al escribir
+    tags.save(file_path, v2_version=3)
+
+
+def write_tags(file_path, frames):
+    offload.run_blocking(_write_tags, file_path, frames)
+
+
+def tag_track(file_path, track, album_data, track_number=None):
+    frames = build_frames(track, album_data, track_number, _album_cover(album_data))
+    write_tags(file_path, frames)
+    logger.info(f"Etiquetas escritas en {file_path}")
+
@@ -0,0 +1,102 @@
+# services/track_downloader.py
+# Descarga de pistas con deezspot limitada a nivel de proceso. Cada pista se
+# descarga en su propio directorio, así el archivo resultante se localiza sin
+# recorrer la carpeta del álbum entero.
+import os
+import shutil
+import logging
+import threading
+
+from services import deezer_session, metrics, track_store
+from services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Descargas simultáneas como máximo en todo el proceso
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", 8))
+# Descargas simultáneas como máximo dentro de un mismo álbum
+ALBUM_TRACK_WORKERS = int(os.environ.get("ALBUM_TRACK_WORKERS", 4))
+
+DEFAULT_QUALITY = 'MP3_128'
+
+_download_slots = threading.BoundedSemaphore(MAX_CONCURRENT_DOWNLOADS)
+
+# Una sola descarga por (song_id, calidad) entre hilos y entre workers
+_flights = SingleFlight()
+
+
+def find_mp3(output_dir):
+    # deezspot crea subcarpetas propias; como el directorio es exclusivo de
+    # la pista, el primer .mp3 encontrado es el descargado
+    for root, _, files in os.walk(output_dir):
+        for file in files:
+            if file.endswith(".mp3"):
+                return os.path.join(root, file)
+    return None
+
+
+def download_track(song_id, output_dir, quality=DEFAULT_QUALITY):
+    os.makedirs(output_dir, exist_ok=True)
+    track_url = f"https://www.deezer.com/track/{song_id}"
+
+    with metrics.stage("track", "queue"):
+        _download_slots.acquire()
+    try:
+        # deezspot se llama directamente, no con offload: su E/S de red
+        # (requests y sus locks) debe quedarse en el greenlet, donde los
+        # sockets parcheados ceden el bucle mientras espera
+        with metrics.stage("track", "download"):
+            deezer_session.run(lambda deezer: deezer.download_trackdee(
+                link_track=track_url,
+                output_dir=output_dir,
+                quality_download=quality,
+                recursive_quality=True,
+                recursive_download=False
+            ))
+    finally:
+        _download_slots.release()
+
+    file_path = find_mp3(output_dir)
+    if not file_path or os.path.getsize(file_path) == 0:
+        logger.warning(f"La descarga de {song_id} no produjo un MP3 válido")
+        return None
+    return file_path
+
+
+def _store_track(song_id, staging_dir, tag, quality):
+    # Se vuelve a mirar el almacén: otro worker puede haberla guardado
+    # mientras esperábamos el lock
+    stored_path = track_store.lookup(song_id, quality)
+    if stored_path is not None:
+        return stored_path, True
+
+    file_path = download_track(song_id, staging_dir, quality)
+    if not file_path:
+        return None, False
+    with metrics.stage("track", "tag"):
+        tag(file_path)
+    stored_path = track_store.insert(song_id, quality, file_path)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return stored_path, False
+
+
+def obtain_track(song_id, dest_path, staging_dir, tag, quality=DEFAULT_QUALITY):
+    # Devuelve (ruta, desde_almacén). Si la pista ya está en el almacén no se
+    # llama a deezspot; si no, se descarga, se etiqueta con tag(ruta) y se
+    # guarda para las siguientes peticiones.
+    stored_path = track_store.lookup(song_id, quality)
+    from_store = stored_path is not None
+    metrics.TRACK_STORE_LOOKUPS.inc(result="hit" if from_store else "miss")
+
+    if not from_store:
+        stored_path, from_store = _flights.do(
+            f"track:{song_id}:{quality}", _store_track,
+            song_id, staging_dir, tag, quality, cross_process=True
+        )
+        if not stored_path:
+            return None, False
+
+    # La copia final es atómica, así que dos peticiones pueden apuntar al
+    # mismo destino sin pisarse
+    track_store.materialize(stored_path, dest_path)
+    return dest_path, from_store
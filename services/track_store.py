@@ -0,0 +1,67 @@
+# services/track_store.py
+# Almacén persistente de MP3 ya etiquetados, indexado por (song_id, calidad).
+# La ruta de cada pista se deriva directamente de su clave, así que buscar es
+# un único stat; las inserciones son atómicas (archivo temporal + rename).
+import os
+import uuid
+import shutil
+import logging
+
+from services import offload
+from services.config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+TRACK_STORE_DIR = os.environ.get("TRACK_STORE_DIR", os.path.join(DATA_DIR, "tracks"))
+
+
+def track_path(song_id, quality):
+    # Se reparte en subcarpetas para no tener miles de archivos en una sola
+    song_id = str(song_id)
+    return os.path.join(TRACK_STORE_DIR, song_id[-2:].zfill(2), f"{song_id}-{quality}.mp3")
+
+
+def lookup(song_id, quality):
+    path = track_path(song_id, quality)
+    try:
+        if os.path.getsize(path) > 0:
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def insert(song_id, quality, src_path):
+    # Mueve src_path al almacén; nunca queda un archivo a medias visible
+    path = track_path(song_id, quality)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.move(src_path, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Pista {song_id} ({quality}) guardada en el almacén")
+    return path
+
+
+def materialize(stored_path, dest_path):
+    # Enlace duro si es posible (mismo sistema de archivos), si no copia
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    # rename() no hace nada si ambos nombres apuntan al mismo inodo
+    if os.path.exists(dest_path) and os.path.samefile(stored_path, dest_path):
+        return dest_path
+    tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        try:
+            os.link(stored_path, tmp_path)
+        except OSError:
+            offload.run_blocking(shutil.copyfile, stored_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return dest_path